@@ -2,5 +2,7 @@
 
 python manage.py makemigrations network
 python manage.py migrate
+# Only creates a table when CACHE_URL is a database cache
+python manage.py createcachetable
 python manage.py createsuperuser --no-input
 exec "$@"
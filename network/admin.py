@@ -8,7 +8,7 @@ class UserAdmin(admin.ModelAdmin):
 
 
 class PostAdmin(admin.ModelAdmin):
-    list_display = ("id", "user", "text", "publication_date", "edited")
+    list_display = ("id", "user", "text", "publication_date", "edited", "like_count")
 
 
 class CommentAdmin(admin.ModelAdmin):
@@ -1,15 +1,18 @@
+from datetime import datetime, timedelta
 from typing import Any
 from unicodedata import normalize
 
 import orjson
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.exceptions import ValidationError as ModelError
-from django.core.files.storage import default_storage
 from django.core.paginator import InvalidPage, Paginator
-from django.db.models import Prefetch, Q, QuerySet, prefetch_related_objects
+from django.db import transaction
+from django.db.models import Q, QuerySet
 from django.forms import modelform_factory
-from django.http import HttpRequest
+from django.http import HttpRequest, HttpResponse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from ninja import Form, NinjaAPI
 from ninja.errors import ValidationError as PydanticError
 from ninja.parser import Parser
@@ -17,18 +20,45 @@ from ninja.renderers import BaseRenderer
 from ninja.responses import Response
 from ninja.security import django_auth
 
-from .models import Comment, Post, User
+from . import (
+    feed_cache,
+    images,
+    profiling,
+    realtime,
+    relationships,
+    search,
+    serializers,
+    timeline,
+)
+from .models import Comment, Follow, MediaBlob, Post, User, file_validator
+from .pagination import (
+    PAGE_SIZE,
+    InvalidCursor,
+    encode_cursor,
+    keyset_newer,
+    keyset_page,
+    keyset_since,
+)
 from .schemas import (
     CommentIn,
     EditedPost,
+    PaginatedComments,
     PaginatedPosts,
+    PaginatedUsers,
     PostIn,
     PostOut,
+    PostsSince,
     UserOut,
     UserProfileIn,
     UserProfileOut,
 )
 
+# Most new posts and updated posts sent by a poll of the "since" endpoints
+SINCE_SIZE = 50
+# The activity cursors lag behind, so a like or comment committed while a poll
+# runs is sent by the next one
+ACTIVITY_LAG = timedelta(seconds=5)
+
 
 class AuthHttpRequest(HttpRequest):
     user: User
@@ -43,7 +73,8 @@ class ORJSONRenderer(BaseRenderer):
     media_type = "application/json"
 
     def render(self, request, data, *, response_status):
-        return orjson.dumps(data, option=orjson.OPT_UTC_Z | orjson.OPT_OMIT_MICROSECONDS)
+        with profiling.rendering(request):
+            return orjson.dumps(data, option=orjson.OPT_UTC_Z | orjson.OPT_OMIT_MICROSECONDS)
 
 
 # It's needed to add Ninja namespace inside the Django app namespace
@@ -72,6 +103,11 @@ def django_model_validation(request: HttpRequest, exc):
     return api.create_response(request, exc.message_dict, status=400)
 
 
+@api.exception_handler(InvalidCursor)
+def invalid_cursor(request: HttpRequest, exc):
+    return api.create_response(request, {"errors": "Invalid cursor."}, status=400)
+
+
 @api.exception_handler(PydanticError)
 def pydantic_validation(request: HttpRequest, exc):
     for obj in exc.errors:
@@ -92,11 +128,15 @@ def new_post(request: AuthHttpRequest, new_post: PostIn):
     Create a new post.
     """
 
-    post = Post.objects.create(user=request.user, text=new_post.text)
-    post.liked_by.add(request.user)
+    with transaction.atomic():
+        post = Post.objects.create(user=request.user, text=new_post.text, like_count=1)
+        post.liked_by.add(request.user)
+        search.index_post(post)
+        timeline.fan_out_post.delay(post_id=post.id)
+        feed_cache.invalidate_feed(request.user.id)
+        realtime.post_created(post)
     post.is_owner = True
     post.is_following = False
-    post.likes = 1
     post.liked_by_user = True
 
     return post
@@ -118,9 +158,13 @@ def edit_post(request: AuthHttpRequest, edited_post: PostIn):
         return 404, {"error": "Post not found."}
 
     post.text = edited_post.text
-    post.last_modified = timezone.now()
+    post.last_modified = post.activity_date = timezone.now()
     post.edited = True
-    post.save()
+    with transaction.atomic():
+        post.save()
+        search.index_post(post)
+    feed_cache.invalidate_post(post.id)
+    realtime.post_edited(post)
 
     return post
 
@@ -128,15 +172,45 @@ def edit_post(request: AuthHttpRequest, edited_post: PostIn):
 @api.patch("like_post/{int:post_id}", url_name="like_post")
 def like_post(request: AuthHttpRequest, post_id: int):
     """
-    Like a post by ID.
+    Toggle the like of a post by ID.
     """
-    post: Post = Post.objects.get(id=post_id)
-    if post in request.user.liked_posts.all():
-        request.user.liked_posts.remove(post)
-        return {"id": post.id, "likes": post.liked_by.count(), "likedByUser": False}
+    changed, likes, author_id = Post.objects.remove_like(post_id, request.user.id)
+    liked_by_user = False
+    if not changed:
+        changed, likes, author_id = Post.objects.add_like(post_id, request.user.id)
+        liked_by_user = True
 
-    request.user.liked_posts.add(post)
-    return {"id": post.id, "likes": post.liked_by.count(), "likedByUser": True}
+    if changed:
+        feed_cache.invalidate_post(post_id)
+        realtime.likes_changed(post_id, author_id, likes)
+
+    return {"id": post_id, "likes": likes, "likedByUser": liked_by_user}
+
+
+@api.put("like_post/{int:post_id}")
+def put_like(request: AuthHttpRequest, post_id: int):
+    """
+    Like a post by ID. Liking a post twice is a no-op.
+    """
+    changed, likes, author_id = Post.objects.add_like(post_id, request.user.id)
+    if changed:
+        feed_cache.invalidate_post(post_id)
+        realtime.likes_changed(post_id, author_id, likes)
+
+    return {"id": post_id, "likes": likes, "likedByUser": True}
+
+
+@api.delete("like_post/{int:post_id}")
+def delete_like(request: AuthHttpRequest, post_id: int):
+    """
+    Unlike a post by ID. Unliking a post twice is a no-op.
+    """
+    changed, likes, author_id = Post.objects.remove_like(post_id, request.user.id)
+    if changed:
+        feed_cache.invalidate_post(post_id)
+        realtime.likes_changed(post_id, author_id, likes)
+
+    return {"id": post_id, "likes": likes, "likedByUser": False}
 
 
 @api.post("new_comment", url_name="new_comment", response=PostOut)
@@ -153,7 +227,7 @@ def new_comment(request: AuthHttpRequest, new_comment: CommentIn):
         parent_comment = None
         reply = False
 
-    Comment.objects.create(
+    comment = Comment.objects.create(
         post=post,
         user=request.user,
         text=new_comment.text,
@@ -161,67 +235,268 @@ def new_comment(request: AuthHttpRequest, new_comment: CommentIn):
         parent_comment=parent_comment,
     )
 
+    feed_cache.invalidate_post(post.id)
+
     post.refresh_from_db()
-    prefetch_related_objects(
-        [post],
-        Prefetch("comments", queryset=Comment.objects.select_related().filter(reply=False)),
-    )
+    realtime.comment_created(comment, post.comment_count)
+    Comment.objects.prefetch_trees([post])
 
     post.is_owner = post.user.id == request.user.id
-    post.is_following = request.user in post.user.followers.all()
-    post.likes = post.liked_by.count()
-    post.liked_by_user = request.user in post.liked_by.all()
+    liked, following = relationships.overlay(request.user, [post.id], [post.user_id])
+    post.is_following = post.user_id in following
+    post.liked_by_user = post.id in liked
 
     return post
 
 
+@api.get(
+    "comments/{int:post_id}",
+    url_name="comments",
+    auth=None,
+    response=PaginatedComments,
+)
+def post_comments(request: HttpRequest, post_id: int, cursor: str = None):
+    """
+    Paginate the top level comments of a post, newest first.
+    """
+    post = Post.objects.only("id").get(id=post_id)
+    comments = Comment.objects.select_related("user").filter(post=post, parent_comment=None)
+
+    return comments_cursor_pager(comments, cursor)
+
+
+@api.get(
+    "replies/{int:comment_id}",
+    url_name="replies",
+    auth=None,
+    response=PaginatedComments,
+)
+def comment_replies(request: HttpRequest, comment_id: int, cursor: str = None):
+    """
+    Paginate the direct replies of a comment, newest first.
+    """
+    comment = Comment.objects.only("id").get(id=comment_id)
+    replies = Comment.objects.select_related("user").filter(parent_comment=comment)
+
+    return comments_cursor_pager(replies, cursor)
+
+
 @api.get(
     "all_posts/{int:page}",
     url_name="all_posts",
     auth=None,
     response=PaginatedPosts,
 )
-def get_all_posts(request: HttpRequest, page: int):
+def get_all_posts(request: HttpRequest, response: HttpResponse, page: int):
     """
     Fetch all posts from the database. These posts can be shown to unauthenticated users.
+
+    Supports conditional requests, a page that didn't change since the ETag or
+    Last-Modified sent by the client is answered with a 304 from the cache.
     """
-    posts = Post.objects.fetch_all_posts(request_user=request.user)
+    # The rows of a page are the same for every viewer
+    posts = Post.objects.fetch_all_posts()
+    data, version = feed_cache.get_page(page, lambda: posts_pager(posts, page))
 
-    if posts is None or posts.exists() is False:
+    if not data["posts"]:
         return Response({"posts": []})
 
-    return posts_pager(posts, page)
+    etag, last_modified = feed_cache.page_stamp(version, data["posts"], request.user)
+    unchanged = not_modified(request, response, etag, last_modified)
+    if unchanged:
+        return unchanged
+
+    return feed_response(request, response, render_page(data, request.user))
+
+
+@api.get("all_posts", url_name="all_posts_cursor", auth=None, response=PaginatedPosts)
+def get_all_posts_cursor(request: HttpRequest, response: HttpResponse, cursor: str = None):
+    """
+    Fetch all posts using keyset pagination. Pass the "nextCursor" of a page to
+    get the next one.
+    """
+    posts = Post.objects.fetch_all_posts()
+
+    return feed_response(
+        request, response, render_page(posts_cursor_pager(posts, cursor), request.user)
+    )
+
+
+@api.get("all_posts/since", url_name="all_posts_since", auth=None, response=PostsSince)
+def all_posts_since(
+    request: HttpRequest,
+    cursor: str = None,
+    timestamp: datetime = None,
+    activity: str = None,
+    count: bool = False,
+):
+    """
+    Posts published since the last poll, see posts_since.
+    """
+    posts = Post.objects.fetch_all_posts()
+
+    return posts_since(request, posts, cursor, timestamp, activity, count)
 
 
 @api.post("follow/{str:username}", url_name="follow")
 def follow(request: AuthHttpRequest, username: str):
     user = User.objects.get(username=username)
 
-    if user in request.user.following.all():
-        request.user.following.remove(user)
-        return {"message": f"You are no longer following {username}"}
+    if user.id == request.user.id:
+        return api.create_response(request, {"errors": "You can't follow yourself."}, status=400)
 
-    request.user.following.add(user)
+    with transaction.atomic():
+        if User.objects.unfollow(request.user, user):
+            timeline.sync_follow.delay(follower_id=request.user.id, followed_id=user.id)
+            feed_cache.invalidate_viewer(request.user.id)
+            feed_cache.invalidate_profile(request.user.id, user.id)
+            return {"message": f"You are no longer following {username}"}
+
+        User.objects.follow(request.user, user)
+        timeline.sync_follow.delay(follower_id=request.user.id, followed_id=user.id)
+        feed_cache.invalidate_viewer(request.user.id)
+        feed_cache.invalidate_profile(request.user.id, user.id)
     return {"message": f"You are now following {username}"}
 
 
 @api.get("following_posts/{int:page}", url_name="following_posts", response=PaginatedPosts)
-def following_posts(request: AuthHttpRequest, page: int):
+def following_posts(request: AuthHttpRequest, response: HttpResponse, page: int):
+    posts = timeline.FollowingFeed(request.user)
+
+    return feed_response(request, response, render_page(posts_pager(posts, page), request.user))
+
+
+@api.get(
+    "following_posts",
+    url_name="following_posts_cursor",
+    response=PaginatedPosts,
+)
+def following_posts_cursor(request: AuthHttpRequest, response: HttpResponse, cursor: str = None):
+    posts = timeline.FollowingFeed(request.user)
+
+    return feed_response(
+        request, response, render_page(posts_cursor_pager(posts, cursor), request.user)
+    )
+
+
+@api.get("following_posts/since", url_name="following_posts_since", response=PostsSince)
+def following_posts_since(
+    request: AuthHttpRequest,
+    cursor: str = None,
+    timestamp: datetime = None,
+    activity: str = None,
+    count: bool = False,
+):
     posts = Post.objects.fetch_following_posts(request.user)
 
-    return posts_pager(posts, page)
+    return posts_since(request, posts, cursor, timestamp, activity, count)
 
 
 @api.get("profile/{str:username}/{int:page}", url_name="profile", response=UserOut)
-def profile(request: AuthHttpRequest, username: str, page: int):
+def profile(request: AuthHttpRequest, response: HttpResponse, username: str, page: int):
+    """
+    Profile of a user with a page of their posts. Supports conditional
+    requests, like all_posts.
+    """
+    profile_user = User.objects.fetch_profile(request.user, username)
+    posts = Post.objects.fetch_all_posts().filter(user=profile_user)
+    data, version = feed_cache.get_page(
+        page, lambda: posts_pager(posts, page), author_id=profile_user.id
+    )
+
+    # The profile fields have no version, they are part of the ETag
+    fields = (
+        profile_user.username,
+        profile_user.email,
+        profile_user.about,
+        profile_user.photo.name,
+        profile_user.photo_variants,
+        profile_user.last_login,
+        profile_user.following_count,
+        profile_user.followers_count,
+        profile_user.is_following,
+    )
+    etag, last_modified = feed_cache.page_stamp(
+        version, data["posts"], request.user, extra=repr(fields)
+    )
+    if profile_user.last_login:
+        # Logins update last_login without replacing a version
+        last_modified = max(last_modified, profile_user.last_login)
+    unchanged = not_modified(request, response, etag, last_modified)
+    if unchanged:
+        return unchanged
+
+    profile_user.posts_data = render_page(data, request.user)
+
+    return profile_user
+
+
+@api.get("profile/{str:username}", url_name="profile_cursor", response=UserOut)
+def profile_cursor(request: AuthHttpRequest, username: str, cursor: str = None):
     profile_user = User.objects.fetch_profile(request.user, username)
+    posts = Post.objects.fetch_all_posts().filter(user=profile_user)
 
-    profile_user.is_following = request.user in profile_user.followers.all()
-    profile_user.posts_data = posts_pager(profile_user.posts.all(), page)
+    profile_user.posts_data = render_page(posts_cursor_pager(posts, cursor), request.user)
 
     return profile_user
 
 
+@api.get("followers/{str:username}", url_name="followers", response=PaginatedUsers)
+def followers(request: AuthHttpRequest, username: str, cursor: str = None):
+    """
+    Followers of ``username``, most recent first.
+    """
+    user = User.objects.get(username=username)
+    follows = Follow.objects.filter(followed=user)
+
+    return users_cursor_pager(follows, "follower", cursor, request.user)
+
+
+@api.get("following/{str:username}", url_name="following", response=PaginatedUsers)
+def following(request: AuthHttpRequest, username: str, cursor: str = None):
+    """
+    Accounts followed by ``username``, most recently followed first.
+    """
+    user = User.objects.get(username=username)
+    follows = Follow.objects.filter(follower=user)
+
+    return users_cursor_pager(follows, "followed", cursor, request.user)
+
+
+@api.get("search/posts", url_name="search_posts", auth=None, response=PaginatedPosts)
+def search_posts(request: HttpRequest, response: HttpResponse, q: str, cursor: str = None):
+    """
+    Posts that contain the words of ``q``, best match first, see network/search.py.
+    """
+    post_ids, next_cursor = search.search("posts", q, cursor)
+    rows = {row["id"]: row for row in Post.objects.fetch_all_posts().filter(id__in=post_ids)}
+
+    data = {
+        "numPages": None,
+        "nextPage": None,
+        "previousPage": None,
+        "nextCursor": next_cursor,
+        "posts": [rows[post_id] for post_id in post_ids if post_id in rows],
+    }
+    return feed_response(request, response, render_page(data, request.user))
+
+
+@api.get("search/users", url_name="search_users", response=PaginatedUsers)
+def search_users(request: AuthHttpRequest, q: str, cursor: str = None):
+    """
+    Users whose username or about text contain the words of ``q``, best match first.
+    """
+    user_ids, next_cursor = search.search("users", q, cursor)
+    found = User.objects.in_bulk(user_ids)
+    users = [found[user_id] for user_id in user_ids if user_id in found]
+
+    followed = relationships.followed_ids(request.user, user_ids)
+    for user in users:
+        user.is_following = user.id in followed
+
+    return {"nextCursor": next_cursor, "users": users}
+
+
 @api.post("update_profile", url_name="update_profile", response=UserProfileOut)
 def update_profile(request: AuthHttpRequest, profile: UserProfileIn = Form(...)):
     errors = {}
@@ -235,12 +510,15 @@ def update_profile(request: AuthHttpRequest, profile: UserProfileIn = Form(...))
     if request.user.email != profile.email and User.objects.filter(email=profile.email).exists():
         errors["email"] = f"{profile.email} is already in use."
 
+    # Photos past the maximum size were dropped while they were uploaded
+    rejected = getattr(request, "rejected_uploads", {})
+    if "photo" in rejected:
+        error = file_validator.upload_error(rejected["photo"]).messages[0]
+        errors["photo"] = normalize("NFKD", error)
+
     # Create a form to validate the uploaded file
-    previous_image_path = None
     ProfileForm = modelform_factory(User, fields=("username", "email", "photo", "about"))
-
-    if request.user.photo and request.FILES:
-        previous_image_path = request.user.photo.path
+    previous_photos = [request.user.photo.name, *images.variant_names(request.user.photo_variants)]
 
     if request.FILES:
         form = ProfileForm(profile.dict(), request.FILES, instance=request.user)
@@ -248,9 +526,28 @@ def update_profile(request: AuthHttpRequest, profile: UserProfileIn = Form(...))
         form = ProfileForm(profile.dict(), instance=request.user)
 
     if not errors and form.is_valid():
-        if form.cleaned_data["photo"] and previous_image_path:
-            default_storage.delete(previous_image_path)
-        user = form.save()
+        photo_changed = "photo" in form.changed_data
+        if photo_changed:
+            # The variants of the previous photo are not served anymore
+            form.instance.photo_variants = {}
+        with transaction.atomic():
+            user = form.save()
+            if {"username", "about"} & set(form.changed_data):
+                search.index_user(user)
+            if photo_changed:
+                # The previous files are deleted by "manage.py gc_media" once
+                # nothing references them
+                MediaBlob.objects.release(previous_photos)
+                MediaBlob.objects.acquire([user.photo.name])
+        if photo_changed and user.photo:
+            images.process_photo.delay(user_id=user.id, name=user.photo.name)
+        if form.changed_data:
+            # The profile fields are part of the validators of the profile pages
+            feed_cache.invalidate_profile(user.id)
+        if "username" in form.changed_data:
+            # Usernames are part of the cached post bodies and comment previews
+            feed_cache.invalidate_author(user.id)
+            feed_cache.invalidate_commented_posts.delay(user_id=user.id)
         return user
     else:
         if form.errors.get("photo"):
@@ -264,11 +561,31 @@ def update_profile(request: AuthHttpRequest, profile: UserProfileIn = Form(...))
 
 # endregion
 
+
+# --------------------
+# region Profiling
+# --------------------
+
+
+@api.get("profiling", url_name="profiling")
+def profiling_stats(request: AuthHttpRequest):
+    """
+    Per-endpoint stats collected when NETWORK_API_PROFILING is on.
+    """
+    if not request.user.is_staff:
+        return api.create_response(request, {"errors": "Forbidden."}, status=403)
+
+    return {"enabled": profiling.enabled(), "endpoints": profiling.stats()}
+
+
+# endregion
+
+
 # -----------
 # region Functions
 # -----------
-def posts_pager(posts: QuerySet[Post], page: int):
-    p = Paginator(posts, 10)
+def posts_pager(posts: QuerySet | timeline.FollowingFeed, page: int):
+    p = Paginator(posts, PAGE_SIZE)
 
     p_page = p.get_page(page)
 
@@ -282,7 +599,7 @@ def posts_pager(posts: QuerySet[Post], page: int):
     except InvalidPage:
         previous_page = None
 
-    # Cast "QuerySet" to "list" to be parsed by Pydantic Model
+    # Cast "QuerySet" to "list" so the page can be cached
     return {
         "numPages": p.num_pages,
         "nextPage": next_page,
@@ -291,4 +608,144 @@ def posts_pager(posts: QuerySet[Post], page: int):
     }
 
 
+def posts_cursor_pager(posts: QuerySet | timeline.FollowingFeed, cursor: str | None):
+    """
+    Keyset counterpart of posts_pager. Pages are keyed on
+    (publication_date, id), so there is no COUNT(*) and no OFFSET scan.
+    """
+    if isinstance(posts, timeline.FollowingFeed):
+        page_posts, next_cursor = posts.keyset_page(cursor)
+    else:
+        page_posts, next_cursor = keyset_page(posts, cursor)
+
+    return {
+        "numPages": None,
+        "nextPage": None,
+        "previousPage": None,
+        "nextCursor": next_cursor,
+        "posts": page_posts,
+    }
+
+
+def posts_since(
+    request: HttpRequest,
+    posts: QuerySet,
+    cursor: str | None,
+    timestamp: datetime | None,
+    activity: str | None,
+    count: bool,
+):
+    """
+    Poll a feed for the posts published after ``cursor``, the "cursor" of the
+    previous poll, or after ``timestamp`` for the first one. Both are a range
+    scan of the feed index, oldest first, so a client that falls behind gets
+    the next posts on the next poll.
+
+    With ``count``, only the number of new posts is returned, up to SINCE_SIZE.
+    With ``activity``, the "activityCursor" of the previous poll, the posts of
+    the feed edited, liked or commented since then are sent as updates.
+    """
+    if cursor is None and timestamp is None:
+        return api.create_response(
+            request, {"errors": "A cursor or a timestamp is required."}, status=400
+        )
+
+    new_posts = posts if timestamp is None else posts.filter(publication_date__gt=timestamp)
+
+    if count:
+        # COUNT(*) over a LIMIT subquery, bounded like a page
+        total = keyset_newer(new_posts, cursor)[: SINCE_SIZE + 1].count()
+        return {"count": min(total, SINCE_SIZE), "hasMore": total > SINCE_SIZE, "cursor": cursor}
+
+    rows, cursor, has_more = keyset_since(new_posts, cursor, size=SINCE_SIZE)
+    data = {
+        "hasMore": has_more,
+        "cursor": cursor,
+        "posts": feed_cache.render_posts(rows, request.user),
+    }
+
+    updates = []
+    activity_cursor = encode_cursor(timezone.now() - ACTIVITY_LAG, 0)
+    if activity is not None:
+        changed = posts.values(
+            "id", "text", "edited", "like_count", "comment_count", "last_modified", "activity_date"
+        )
+        updates, next_activity, more_updates = keyset_since(
+            changed, activity, fields=("activity_date", "id"), size=SINCE_SIZE
+        )
+        if more_updates:
+            # Resume after the last update sent instead of skipping the rest
+            activity_cursor = next_activity
+
+    new_ids = {row["id"] for row in rows}
+    data["updates"] = [row for row in updates if row["id"] not in new_ids]
+    data["activityCursor"] = activity_cursor
+
+    return data
+
+
+def render_page(data: dict, request_user) -> dict:
+    """
+    Replace the rows selected by a pager with the posts rendered for the viewer.
+    """
+    return {**data, "posts": feed_cache.render_posts(data["posts"], request_user)}
+
+
+def feed_response(request: HttpRequest, response: HttpResponse, data: dict):
+    """
+    Respond with a page returned by render_page. With the fast serializer,
+    the page is rendered without being validated by PaginatedPosts again.
+    """
+    if serializers.enabled():
+        return api.create_response(
+            request, serializers.paginated_posts(data), temporal_response=response
+        )
+
+    return data
+
+
+def not_modified(
+    request: HttpRequest, response: HttpResponse, etag: str, last_modified: datetime
+) -> HttpResponse | None:
+    """
+    Set the validators of a page on ``response``. Returns a 304 response if
+    the client already has this version of the page.
+    """
+    response["ETag"] = quote_etag(etag)
+    response["Last-Modified"] = http_date(last_modified.timestamp())
+
+    conditional = get_conditional_response(
+        request,
+        etag=response["ETag"],
+        last_modified=int(last_modified.timestamp()),
+        response=response,
+    )
+    return None if conditional is response else conditional
+
+
+def comments_cursor_pager(comments: QuerySet[Comment], cursor: str | None):
+    page_comments, next_cursor = keyset_page(comments, cursor)
+    Comment.objects.prefetch_replies(page_comments)
+
+    return {"nextCursor": next_cursor, "comments": page_comments}
+
+
+def users_cursor_pager(follows: QuerySet[Follow], side: str, cursor: str | None, request_user):
+    """
+    Page through the ``side`` users ("follower" or "followed") of follow edges,
+    keyed on (created, id). The isFollowing flags of the page are looked up
+    with a single query.
+    """
+    page_follows, next_cursor = keyset_page(
+        follows.select_related(side), cursor, fields=("created", "id")
+    )
+    users = [getattr(follow, side) for follow in page_follows]
+
+    followed = relationships.followed_ids(request_user, [user.id for user in users])
+    for user in users:
+        user.is_following = user.id in followed
+
+    return {"nextCursor": next_cursor, "users": users}
+
+
 # endregion
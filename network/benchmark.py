@@ -0,0 +1,156 @@
+"""
+Latency and query benchmarks of the API endpoints.
+
+Each scenario is a request made with the Django test client against the
+configured database, so run it on a seeded copy (see seed_network), never on
+production data: like_post, follow, new_comment and new_post write rows.
+"""
+
+from datetime import timedelta
+from statistics import mean, median, quantiles
+from time import perf_counter
+from typing import Callable
+
+import django
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.test import Client
+from django.urls import reverse
+
+from .models import Comment, Post, User
+from .pagination import encode_cursor
+from .profiling import QueryCounter
+
+
+def scenarios(author: User, post: Post) -> dict[str, Callable[[Client], object]]:
+    """
+    Requests of each benchmarked endpoint. ``author`` is the profile and follow
+    target, ``post`` is liked and commented.
+    """
+    json = "application/json"
+
+    return {
+        "all_posts": lambda client: client.get(reverse("network:api:all_posts", args=[1])),
+        "all_posts_cursor": lambda client: client.get(reverse("network:api:all_posts_cursor")),
+        "following_posts": lambda client: client.get(
+            reverse("network:api:following_posts", args=[1])
+        ),
+        # A poll that gets every post of the viewer's feed, and their updates
+        "following_posts_since": lambda client: client.get(
+            reverse("network:api:following_posts_since"),
+            {
+                "timestamp": post.publication_date - timedelta(days=1),
+                "activity": encode_cursor(post.publication_date - timedelta(days=1), 0),
+            },
+        ),
+        "profile": lambda client: client.get(
+            reverse("network:api:profile", args=[author.username, 1])
+        ),
+        "comments": lambda client: client.get(reverse("network:api:comments", args=[post.id])),
+        "like_post": lambda client: client.patch(reverse("network:api:like_post", args=[post.id])),
+        "follow": lambda client: client.post(reverse("network:api:follow", args=[author.username])),
+        "new_comment": lambda client: client.post(
+            reverse("network:api:new_comment"),
+            {"text": "Benchmark comment", "postID": post.id},
+            content_type=json,
+        ),
+        "new_post": lambda client: client.post(
+            reverse("network:api:new_post"), {"text": "Benchmark post"}, content_type=json
+        ),
+    }
+
+
+def measure(client: Client, request: Callable[[Client], object]) -> dict:
+    """
+    Latency, number of queries and number of rows fetched by one request.
+    """
+    with QueryCounter() as counter:
+        start = perf_counter()
+        response = request(client)
+        elapsed = perf_counter() - start
+
+    return {
+        "ms": elapsed * 1000,
+        "queries": counter.queries,
+        "rows": counter.rows,
+        "db_ms": counter.seconds * 1000,
+        "status": response.status_code,
+    }
+
+
+def summarize(samples: list[dict]) -> dict:
+    latencies = [sample["ms"] for sample in samples]
+    # quantiles needs at least 2 samples
+    p95 = quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+
+    return {
+        "iterations": len(samples),
+        "p50_ms": round(median(latencies), 3),
+        "p95_ms": round(p95, 3),
+        "mean_ms": round(mean(latencies), 3),
+        "db_p50_ms": round(median(sample["db_ms"] for sample in samples), 3),
+        "queries": max(sample["queries"] for sample in samples),
+        "rows": max(sample["rows"] for sample in samples),
+        "statuses": sorted({sample["status"] for sample in samples}),
+    }
+
+
+def pick_actors():
+    """
+    The viewer following the most accounts, the most followed other author
+    with posts and the most commented post.
+    """
+    viewer = User.objects.order_by("-following_count", "id").first()
+    if viewer is None:
+        return None, None, None
+
+    author = (
+        User.objects.exclude(id=viewer.id)
+        .filter(Exists(Post.objects.filter(user=OuterRef("id"))))
+        .order_by("-followers_count", "id")
+        .first()
+    )
+    post = Post.objects.order_by("-comment_count", "-id").first()
+
+    return viewer, author, post
+
+
+def run(
+    names: list[str] | None = None, iterations: int = 50, warmup: int = 5, cold: bool = False
+) -> dict:
+    """
+    Benchmark the endpoints ``names`` (all of them by default) as the viewer
+    returned by pick_actors. With ``cold``, the cache is cleared before every
+    request.
+    """
+    viewer, author, post = pick_actors()
+    if viewer is None or author is None or post is None:
+        raise ValueError("The database needs at least two users and a post")
+
+    client = Client(SERVER_NAME="localhost")
+    client.force_login(viewer)
+
+    requests = scenarios(author, post)
+    results = {}
+    for name in names or requests:
+        samples = []
+        for i in range(warmup + iterations):
+            if cold:
+                cache.clear()
+            sample = measure(client, requests[name])
+            if i >= warmup:
+                samples.append(sample)
+        results[name] = summarize(samples)
+
+    return {
+        "environment": {
+            "vendor": connection.vendor,
+            "django": django.get_version(),
+            "users": User.objects.count(),
+            "posts": Post.objects.count(),
+            "comments": Comment.objects.count(),
+            "cold_cache": cold,
+        },
+        "endpoints": results,
+    }
@@ -0,0 +1,289 @@
+"""
+Two-phase assembly of the post feeds.
+
+1. The posts of a page are selected as bare (id, user_id, publication_date)
+   rows, the same for every viewer. The rows of each all_posts page are
+   cached.
+2. Each post is serialized once for everyone, with the viewer flags off, and
+   cached by post id. The flags of the current viewer (isOwner, likedByUser,
+   isFollowing) are then overlaid from a single query.
+
+The rows of the first pages of each profile are cached the same way.
+
+There is no expiry, entries are invalidated by the views that change them:
+  - new_post replaces the feed version and the profile version of the
+    author, since every page shifts;
+  - edit_post, like_post and new_comment replace the version of one post;
+  - renaming a user replaces the version of the author, as usernames are part
+    of their post bodies, and the versions of the posts they commented on,
+    for the comment previews (invalidate_commented_posts);
+  - following or unfollowing replaces the viewer version of the follower, as
+    the isFollowing flags of their pages change;
+  - changing the fields of a profile, or its follow counters, replaces the
+    profile version of the user, which is part of the validators of the
+    profile pages.
+
+Versions are random tokens rather than counters, so a version key that is
+evicted from the cache can never match a key stored before the eviction.
+Versions are always read before the database, so an entry built from rows
+that changed afterwards is stored under a version nobody reads anymore.
+
+Tokens start with the time they were created, so the versions of a page also
+give its ETag and Last-Modified, see page_stamp.
+"""
+
+from datetime import datetime, timezone
+from hashlib import sha1
+from time import time
+from typing import Callable
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import relationships, serializers
+from .models import Comment, Post
+from .schemas import PostOut
+from .tasks import task
+
+FEED_VERSION_KEY = "network:feed:version"
+
+# Post versions replaced per cache call by invalidate_commented_posts
+INVALIDATE_BATCH_SIZE = 1000
+
+
+def timeout() -> int | None:
+    # Entries of replaced versions are never read again, the timeout only
+    # reclaims their memory
+    return getattr(settings, "NETWORK_FEED_CACHE_TIMEOUT", 24 * 60 * 60)
+
+
+def page_key(version: str, page: int) -> str:
+    return f"network:feed:{version}:page:{page}"
+
+
+def profile_version_key(user_id: int) -> str:
+    return f"network:feed:profile:{user_id}"
+
+
+def viewer_version_key(user_id: int | None) -> str:
+    return f"network:feed:viewer:{user_id}"
+
+
+def post_version_key(post_id: int) -> str:
+    return f"network:feed:post:{post_id}"
+
+
+def author_version_key(user_id: int) -> str:
+    return f"network:feed:author:{user_id}"
+
+
+def body_key(post_id: int, post_version: str, author_version: str) -> str:
+    return f"network:feed:body:{post_id}:{post_version}:{author_version}"
+
+
+def versions(keys: list[str]) -> dict[str, str]:
+    """
+    Current token of each version key, initializing the missing ones.
+    """
+    tokens = cache.get_many(keys)
+
+    missing = {key: new_token() for key in keys if key not in tokens}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        tokens.update(missing)
+
+    return tokens
+
+
+def new_token() -> str:
+    return f"{int(time() * 1000)}-{uuid4().hex}"
+
+
+def token_time(token: str) -> datetime:
+    milliseconds, _, _ = token.partition("-")
+    try:
+        return datetime.fromtimestamp(int(milliseconds) / 1000, tz=timezone.utc)
+    except ValueError:
+        # Token stored before they were timestamped
+        return datetime.fromtimestamp(0, tz=timezone.utc)
+
+
+def feed_version(author_id: int | None = None) -> str:
+    """
+    Version of the all_posts pages, or of the profile pages of ``author_id``.
+    """
+    key = FEED_VERSION_KEY if author_id is None else profile_version_key(author_id)
+    return versions([key])[key]
+
+
+# --------------------
+# region Pages
+# --------------------
+
+
+def get_page(
+    page: int, build: Callable[[], dict], author_id: int | None = None
+) -> tuple[dict, str]:
+    """
+    Rows of an all_posts page, or of a profile page of ``author_id``, cached
+    from ``build`` (posts_pager over PostManager.fetch_all_posts). Returns
+    them with the version they are cached under.
+    """
+    version = feed_version(author_id)
+    key = page_key(version, page)
+
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, timeout=timeout())
+
+    return data, version
+
+
+def page_stamp(
+    version: str, rows: list[dict], request_user, extra: str = ""
+) -> tuple[str, datetime]:
+    """
+    ETag and Last-Modified of a page returned by get_page, from the versions
+    of everything it's rendered from: its rows, its posts and their authors,
+    and the flags of ``request_user``. ``extra`` is mixed in the ETag, for
+    content that has no version.
+
+    Call it before rendering the page, so the page is never older than its
+    stamp.
+    """
+    viewer_id = request_user.id if request_user.is_authenticated else None
+    keys = [viewer_version_key(viewer_id)]
+    keys += [post_version_key(row["id"]) for row in rows]
+    keys += [author_version_key(row["user_id"]) for row in rows]
+    tokens = [version, *versions(keys).values()]
+
+    digest = sha1(f"{viewer_id}:{extra}".encode())
+    for token in tokens:
+        digest.update(token.encode())
+
+    return digest.hexdigest(), max(token_time(token) for token in tokens)
+
+
+# endregion
+
+# --------------------
+# region Posts
+# --------------------
+
+
+def post_bodies(rows: list[dict]) -> dict[int, dict]:
+    """
+    Serialized PostOut of each row, keyed by post id. Only the posts missing
+    from the cache are loaded from the database.
+    """
+    keys = [post_version_key(row["id"]) for row in rows]
+    keys += [author_version_key(row["user_id"]) for row in rows]
+    tokens = versions(keys)
+
+    keys = {
+        body_key(
+            row["id"],
+            tokens[post_version_key(row["id"])],
+            tokens[author_version_key(row["user_id"])],
+        ): row["id"]
+        for row in rows
+    }
+    bodies = {keys[key]: body for key, body in cache.get_many(keys).items()}
+
+    missing = [post_id for post_id in keys.values() if post_id not in bodies]
+    if missing:
+        if serializers.enabled():
+            fresh = serializers.post_bodies(missing)
+        else:
+            fresh = {
+                post.id: PostOut.from_orm(post).dict()
+                for post in Post.objects.fetch_bodies(missing)
+            }
+        bodies.update(fresh)
+        cache.set_many(
+            {key: fresh[post_id] for key, post_id in keys.items() if post_id in fresh},
+            timeout=timeout(),
+        )
+
+    return bodies
+
+
+def render_posts(rows: list[dict], request_user) -> list[dict]:
+    """
+    Merge the shared post bodies with the flags of ``request_user``.
+    """
+    bodies = post_bodies(rows)
+    liked, following = relationships.overlay(
+        request_user, [row["id"] for row in rows], {row["user_id"] for row in rows}
+    )
+
+    return [
+        {
+            **bodies[row["id"]],
+            "isOwner": row["user_id"] == request_user.id,
+            "likedByUser": row["id"] in liked,
+            "isFollowing": row["user_id"] in following,
+        }
+        for row in rows
+        # Skip posts deleted since the page was cached
+        if row["id"] in bodies
+    ]
+
+
+# endregion
+
+# --------------------
+# region Invalidation
+# --------------------
+
+
+def invalidate_feed(author_id: int):
+    transaction.on_commit(lambda: _replace(FEED_VERSION_KEY))
+    transaction.on_commit(lambda: _replace(profile_version_key(author_id)))
+
+
+def invalidate_post(post_id: int):
+    transaction.on_commit(lambda: _replace(post_version_key(post_id)))
+
+
+def invalidate_author(user_id: int):
+    transaction.on_commit(lambda: _replace(author_version_key(user_id)))
+
+
+@task()
+def invalidate_commented_posts(user_id: int):
+    """
+    Replace the version of every post ``user_id`` commented on, as their
+    comment previews show the username.
+    """
+    post_ids = list(
+        Comment.objects.filter(user_id=user_id).values_list("post_id", flat=True).distinct()
+    )
+
+    def replace():
+        for start in range(0, len(post_ids), INVALIDATE_BATCH_SIZE):
+            batch = post_ids[start : start + INVALIDATE_BATCH_SIZE]
+            cache.set_many(
+                {post_version_key(post_id): new_token() for post_id in batch}, timeout=None
+            )
+
+    transaction.on_commit(replace)
+
+
+def invalidate_profile(*user_ids: int):
+    for user_id in user_ids:
+        transaction.on_commit(lambda user_id=user_id: _replace(profile_version_key(user_id)))
+
+
+def invalidate_viewer(user_id: int):
+    transaction.on_commit(lambda: _replace(viewer_version_key(user_id)))
+
+
+def _replace(key: str):
+    cache.set(key, new_token(), timeout=None)
+
+
+# endregion
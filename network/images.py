@@ -0,0 +1,120 @@
+"""
+Resized copies of the profile photos.
+
+When a user uploads a photo, update_profile queues process_photo as a
+background task (network/tasks.py), so the upload returns without waiting
+for it. It crops the photo to a square of each size in VARIANT_SIZES and
+saves it in each format in FORMATS. The variants carry no metadata: EXIF
+(GPS position, camera) and color profiles are not copied. With the
+content-addressed storage (network/storage.py) identical photos share their
+variants. Their names are saved in User.photo_variants and referenced in
+MediaBlob.
+
+A small compressed file can hold a huge image, photos past MAX_PHOTO_PIXELS
+are never decoded and get no variants.
+"""
+
+import logging
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .models import MediaBlob, User
+from .tasks import task
+from .utility import app_name
+
+logger = logging.getLogger(__name__)
+
+# Side of the square variants, in pixels
+VARIANT_SIZES = (48, 96, 256)
+# Largest photo decoded, far below the decompression bomb limit of Pillow
+MAX_PHOTO_PIXELS = 40_000_000
+# Pillow format and save options of each variant format
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+
+@task()
+def process_photo(user_id: int, name: str):
+    """
+    Build the variants of the photo ``name`` of a user. They are not saved
+    if the user changed their photo in the meantime.
+    """
+    current = User.objects.filter(id=user_id, photo=name)
+    if not current.exists():
+        # The photo was replaced, it may already be deleted by gc_media
+        return
+
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        # Only the header is read so far
+        width, height = image.size
+        if width * height > MAX_PHOTO_PIXELS:
+            logger.warning("Photo %s of user %s is too large: %sx%s", name, user_id, width, height)
+            return
+
+        # JPEG photos are decoded at a reduced scale, still larger than the
+        # largest variant
+        image.draft(None, (max(VARIANT_SIZES), max(VARIANT_SIZES)))
+        image.load()
+
+    # Apply the EXIF orientation before it's dropped
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+    variants = {}
+    for size in VARIANT_SIZES:
+        square = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        variants[str(size)] = {extension: save_variant(square, extension) for extension in FORMATS}
+
+    # feed_cache imports the schemas, which import this module
+    from . import feed_cache
+
+    with transaction.atomic():
+        if current.update(photo_variants=variants):
+            MediaBlob.objects.acquire(variant_names(variants))
+            feed_cache.invalidate_profile(user_id)
+
+
+def save_variant(image: Image.Image, extension: str) -> str:
+    """
+    Encode ``image``, in RGB or RGBA mode, in the format of ``extension``.
+    Returns the storage name.
+    """
+    pillow_format, options = FORMATS[extension]
+
+    if pillow_format == "JPEG" and image.mode == "RGBA":
+        # JPEG has no alpha channel, flatten on white
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image)
+        image = background
+
+    buffer = BytesIO()
+    image.save(buffer, pillow_format, **options)
+
+    return default_storage.save(
+        f"{app_name}/variants/variant.{extension}", ContentFile(buffer.getvalue())
+    )
+
+
+def variant_names(variants: dict) -> list[str]:
+    """
+    Storage names of User.photo_variants.
+    """
+    return [name for formats in variants.values() for name in formats.values()]
+
+
+def variant_urls(variants: dict) -> dict[str, dict[str, str]]:
+    """
+    User.photo_variants with the storage names replaced by their URLs.
+    """
+    return {
+        size: {extension: default_storage.url(name) for extension, name in formats.items()}
+        for size, formats in variants.items()
+    }
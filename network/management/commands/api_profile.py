@@ -0,0 +1,59 @@
+import orjson
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from network import profiling
+
+COLUMNS = [
+    ("requests", "requests"),
+    ("avg_total_ms", "total"),
+    ("max_ms", "max"),
+    ("avg_db_ms", "db"),
+    ("avg_queries", "queries"),
+    ("avg_duplicates", "dups"),
+    ("avg_view_ms", "view"),
+    ("avg_validation_ms", "validation"),
+    ("avg_render_ms", "render"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the per-endpoint stats collected by the API profiling middleware "
+        "(NETWORK_API_PROFILING). Times are averages in milliseconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="Output the stats as JSON.")
+        parser.add_argument("--reset", action="store_true", help="Clear the stats.")
+
+    def handle(self, *args, **options):
+        if isinstance(caches["default"], (LocMemCache, DummyCache)):
+            # The stats of the web processes are in their own memory
+            self.stderr.write(
+                self.style.WARNING(
+                    "The default cache is local to each process, so this command can't read "
+                    "the stats of the server. Set CACHE_URL to a shared cache."
+                )
+            )
+
+        stats = profiling.stats()
+
+        if options["json"]:
+            self.stdout.write(orjson.dumps(stats, option=orjson.OPT_INDENT_2).decode())
+        elif not stats:
+            self.stdout.write("No requests profiled.")
+        else:
+            width = max(len(endpoint) for endpoint in stats)
+            header = "".join(f"{label:>12}" for _, label in COLUMNS)
+            self.stdout.write(f"{'endpoint':<{width}}{header}")
+            ordered = sorted(stats.items(), key=lambda item: -item[1]["avg_total_ms"])
+            for endpoint, entry in ordered:
+                row = "".join(f"{entry[key]:>12}" for key, _ in COLUMNS)
+                self.stdout.write(f"{endpoint:<{width}}{row}")
+
+        if options["reset"]:
+            profiling.reset()
+            self.stdout.write(self.style.SUCCESS("Stats cleared"))
@@ -0,0 +1,61 @@
+import orjson
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from network import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the latency, query count and rows fetched of the API endpoints and write "
+        "them to a JSON file. Writes to the database, run it on a seeded copy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "endpoints",
+            nargs="*",
+            help="Endpoints to benchmark, all of them by default: "
+            + ", ".join(benchmark.scenarios(None, None)),
+        )
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--cold", action="store_true", help="Clear the cache before every request."
+        )
+        parser.add_argument(
+            "--seed-users",
+            type=int,
+            help="Run seed_network with this number of users before benchmarking.",
+        )
+        parser.add_argument("--output", default="benchmark.json", help="'-' for stdout.")
+
+    def handle(self, *args, endpoints=(), **options):
+        unknown = set(endpoints) - set(benchmark.scenarios(None, None))
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        if options["seed_users"]:
+            call_command("seed_network", users=options["seed_users"], stdout=self.stdout)
+
+        try:
+            results = benchmark.run(
+                list(endpoints), options["iterations"], options["warmup"], options["cold"]
+            )
+        except ValueError as error:
+            raise CommandError(error)
+
+        report = orjson.dumps(results, option=orjson.OPT_INDENT_2)
+        if options["output"] == "-":
+            self.stdout.write(report.decode())
+            return
+
+        with open(options["output"], "wb") as output:
+            output.write(report)
+
+        for name, result in results["endpoints"].items():
+            self.stdout.write(
+                f"{name}: p50 {result['p50_ms']}ms, p95 {result['p95_ms']}ms, "
+                f"{result['queries']} queries, {result['rows']} rows"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
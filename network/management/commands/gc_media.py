@@ -0,0 +1,145 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from network.images import variant_names
+from network.models import MediaBlob, User
+from network.utility import app_name
+
+
+def references() -> Counter:
+    """
+    Number of references to each stored file, counted from the users.
+    """
+    counts = Counter()
+    users = User.objects.values_list("photo", "photo_variants")
+    for photo, variants in users.iterator():
+        counts.update(name for name in [photo, *variant_names(variants)] if name)
+
+    return counts
+
+
+def walk(directory: str):
+    """
+    Names of the files under ``directory`` in the default storage.
+    """
+    if not default_storage.exists(directory):
+        return
+
+    directories, files = default_storage.listdir(directory)
+    for name in files:
+        yield f"{directory}/{name}"
+    for name in directories:
+        yield from walk(f"{directory}/{name}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the stored media files that nothing references anymore "
+        "(see network/storage.py). Files released less than --grace minutes "
+        "ago are kept, they may be in use by a request that is still running."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=60,
+            help="Minutes an unreferenced file is kept for.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of files deleted per transaction.",
+        )
+        parser.add_argument(
+            "--recount",
+            action="store_true",
+            help="Recount the references from the users first, fixing counts that drifted.",
+        )
+        parser.add_argument(
+            "--scan",
+            action="store_true",
+            help=(
+                "Also delete the unreferenced files that have no blob, like the photos "
+                "uploaded before the content-addressed storage."
+            ),
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would be deleted.",
+        )
+
+    def handle(self, *args, grace=60, batch_size=1000, dry_run=False, **options):
+        cutoff = timezone.now() - timedelta(minutes=grace)
+
+        if options["recount"]:
+            self.recount(batch_size, dry_run)
+
+        orphans = MediaBlob.objects.filter(ref_count=0, last_used__lt=cutoff)
+        deleted = freed = 0
+
+        if dry_run:
+            deleted = orphans.count()
+            freed = sum(orphans.values_list("size", flat=True))
+        else:
+            while True:
+                with transaction.atomic():
+                    locked = orphans.select_for_update().order_by("id").values_list("id", flat=True)
+                    locked = list(locked[:batch_size])
+                    if not locked:
+                        break
+                    # Checked again once locked, a blob stored or acquired
+                    # meanwhile is kept
+                    batch = list(orphans.filter(id__in=locked).values_list("id", "name", "size"))
+                    for _, name, size in batch:
+                        default_storage.delete(name)
+                        freed += size
+                    MediaBlob.objects.filter(id__in=[blob_id for blob_id, _, _ in batch]).delete()
+                    deleted += len(batch)
+
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {deleted} unreferenced blobs ({filesizeformat(freed)})")
+        )
+
+        if options["scan"]:
+            self.scan(cutoff, dry_run)
+
+    def recount(self, batch_size: int, dry_run: bool):
+        counts = references()
+        fixed = []
+
+        for blob in MediaBlob.objects.only("id", "name", "ref_count").iterator():
+            actual = counts.get(blob.name, 0)
+            if blob.ref_count != actual:
+                blob.ref_count = actual
+                fixed.append(blob)
+
+        if not dry_run:
+            MediaBlob.objects.bulk_update(fixed, ["ref_count"], batch_size=batch_size)
+        self.stdout.write(f"{len(fixed)} reference counts drifted")
+
+    def scan(self, cutoff, dry_run: bool):
+        referenced = set(references())
+        tracked = set(MediaBlob.objects.values_list("name", flat=True))
+        deleted = 0
+
+        for name in walk(app_name):
+            if name in referenced or name in tracked:
+                continue
+            if default_storage.get_modified_time(name) >= cutoff:
+                continue
+            if not dry_run:
+                default_storage.delete(name)
+            deleted += 1
+
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} untracked files"))
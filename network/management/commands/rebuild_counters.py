@@ -0,0 +1,112 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from network.models import Comment, Follow, Post, User
+
+
+def like_count():
+    return (
+        Post.liked_by.through.objects.filter(post_id=OuterRef("id"))
+        .order_by()
+        .values("post_id")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+
+
+def comment_count():
+    return (
+        Comment.objects.filter(post_id=OuterRef("id"))
+        .order_by()
+        .values("post_id")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+
+
+def reply_count():
+    return (
+        Comment.objects.filter(parent_comment_id=OuterRef("id"))
+        .order_by()
+        .values("parent_comment_id")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+
+
+def following_count():
+    return (
+        Follow.objects.filter(follower_id=OuterRef("id"))
+        .order_by()
+        .values("follower_id")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+
+
+def followers_count():
+    return (
+        Follow.objects.filter(followed_id=OuterRef("id"))
+        .order_by()
+        .values("followed_id")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+
+
+# (model, counter field, subquery computing the real value for OuterRef("id"))
+COUNTERS = [
+    (Post, "like_count", like_count),
+    (Post, "comment_count", comment_count),
+    (Comment, "reply_count", reply_count),
+    (User, "following_count", following_count),
+    (User, "followers_count", followers_count),
+]
+
+
+class Command(BaseCommand):
+    help = "Rebuild or verify the denormalized counters from their source tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report counters that drifted, exit with an error if any did.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10_000,
+            help="Number of rows updated per transaction.",
+        )
+
+    def handle(self, *args, verify=False, batch_size=10_000, **options):
+        drifted = 0
+
+        for model, field, source in COUNTERS:
+            actual = Coalesce(Subquery(source()), 0, output_field=IntegerField())
+            label = f"{model.__name__}.{field}"
+
+            if verify:
+                wrong = model.objects.annotate(actual=actual).filter(~Q(**{field: actual})).count()
+                drifted += wrong
+                self.stdout.write(f"{label}: {wrong} drifted")
+                continue
+
+            updated = 0
+            ids = model.objects.order_by("id").values_list("id", flat=True)
+            last_id = 0
+            while True:
+                batch = list(ids.filter(id__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                with transaction.atomic():
+                    updated += model.objects.filter(id__in=batch).update(**{field: actual})
+                last_id = batch[-1]
+
+            self.stdout.write(self.style.SUCCESS(f"{label}: {updated} rebuilt"))
+
+        if drifted:
+            raise CommandError(f"{drifted} counters drifted")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from network import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Index every post and user again (see network/search.py), e.g. after "
+        "rows were changed outside the views."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.rebuild()
+
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
@@ -0,0 +1,70 @@
+from datetime import timedelta
+from time import sleep
+
+from django.core.management.base import BaseCommand
+
+from network import tasks
+from network.models import Task
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the background tasks queued in the database "
+        '(NETWORK_TASKS_MODE = "database", see network/tasks.py).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Number of tasks claimed at once.",
+        )
+        parser.add_argument(
+            "--lease",
+            type=int,
+            default=300,
+            help="Seconds after which the tasks claimed by a worker that died run again.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no task is due instead of waiting for new ones.",
+        )
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Queue the tasks that exhausted their retries again first.",
+        )
+
+    def handle(self, *args, batch_size=50, lease=300, once=False, **options):
+        if options["retry_failed"]:
+            requeued = Task.objects.filter(failed=True).update(failed=False, attempts=0)
+            self.stdout.write(f"{requeued} failed tasks queued again")
+
+        totals = {"done": 0, "retried": 0, "failed": 0}
+        try:
+            while True:
+                result = tasks.run_batch(batch_size, timedelta(seconds=lease))
+                for outcome, count in result.items():
+                    totals[outcome] += count
+
+                if not any(result.values()):
+                    if once:
+                        break
+                    sleep(options["sleep"])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{totals['done']} tasks done, {totals['retried']} retried, "
+                f"{totals['failed']} failed"
+            )
+        )
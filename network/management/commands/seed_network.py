@@ -0,0 +1,356 @@
+import sys
+from argparse import ArgumentTypeError
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from itertools import accumulate
+from random import Random
+from typing import Iterable, Iterator
+
+import orjson
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from network import search, timeline
+from network.models import Comment, Follow, Post, User
+
+Like = Post.liked_by.through
+
+# Record types of the stream, in insertion order. Every record only refers to
+# rows of earlier records.
+MODELS = {
+    "user": User,
+    "follow": Follow,
+    "post": Post,
+    "like": Like,
+    "comment": Comment,
+}
+
+# Fields every record of a type must have, the other records refer to them
+REQUIRED_FIELDS = {
+    "user": ("id", "username"),
+    "follow": ("follower_id", "followed_id"),
+    "post": ("id", "user_id", "text"),
+    "like": ("post_id", "user_id"),
+    "comment": ("id", "post_id", "user_id", "text"),
+}
+
+# Dates set on creation, which the records may leave out. The records set
+# them while loading, see explicit_dates
+AUTO_DATES = {
+    kind: [
+        field.attname
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now_add", False)
+    ]
+    for kind, model in MODELS.items()
+}
+
+# Default end of the generated dates, fixed so a seed always gives the same
+# records
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud"
+).split()
+
+
+@contextmanager
+def explicit_dates():
+    """
+    Let bulk_create store the dates of the records instead of the current time.
+    """
+    fields = [
+        field
+        for model in MODELS.values()
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now_add", False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Generator:
+    """
+    Deterministic stream of records for a synthetic network.
+
+    Popularity follows a power law: the n-th user is followed and liked with a
+    weight of 1 / n ** skew, so a few accounts gather most of the followers.
+    """
+
+    def __init__(self, options: dict):
+        self.random = Random(options["seed"])
+        self.users = options["users"]
+        self.follows = options["follows"]
+        self.posts = options["posts"]
+        self.likes = options["likes"]
+        self.comments = options["comments"]
+        self.reply_ratio = options["reply_ratio"]
+        self.prefix = options["prefix"]
+        self.now = options["now"] or EPOCH
+
+        # New rows are numbered after the existing ones
+        self.first_user = (User.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+        self.next_post = (Post.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+        self.next_comment = (Comment.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+
+        weights = [1 / (rank + 1) ** options["skew"] for rank in range(self.users)]
+        self.cum_weights = list(accumulate(weights))
+        self.user_ids = range(self.first_user, self.first_user + self.users)
+
+    def __iter__(self) -> Iterator[tuple[str, dict]]:
+        yield from self.user_records()
+        yield from self.follow_records()
+        for user_id in self.user_ids:
+            for _ in range(self.amount(self.posts)):
+                yield from self.post_records(user_id)
+
+    def amount(self, mean: float) -> int:
+        # Exponentially distributed, so most values are small and a few large
+        return int(self.random.expovariate(1 / mean)) if mean else 0
+
+    def date(self, after=None):
+        start = after or self.now - timedelta(days=365)
+        seconds = int((self.now - start).total_seconds())
+        return start + timedelta(seconds=self.random.randint(0, max(seconds, 0)))
+
+    def text(self, low: int, high: int) -> str:
+        words = self.random.choices(WORDS, k=self.random.randint(low, high))
+        return " ".join(words).capitalize()
+
+    def popular(self, k: int) -> set[int]:
+        k = min(k, self.users)
+        picks = self.random.choices(self.user_ids, cum_weights=self.cum_weights, k=k)
+        return set(picks)
+
+    def user_records(self):
+        for user_id in self.user_ids:
+            username = f"{self.prefix}{user_id}"
+            date_joined = self.date()
+            yield "user", {
+                "id": user_id,
+                "username": username,
+                "email": f"{username}@example.com",
+                "date_joined": date_joined,
+                "last_login": self.date(date_joined),
+            }
+
+    def follow_records(self):
+        for follower_id in self.user_ids:
+            for followed_id in sorted(self.popular(self.amount(self.follows))):
+                if followed_id != follower_id:
+                    yield "follow", {
+                        "follower_id": follower_id,
+                        "followed_id": followed_id,
+                        "created": self.date(),
+                    }
+
+    def post_records(self, user_id: int):
+        post_id = self.next_post
+        self.next_post += 1
+        publication_date = self.date()
+
+        yield "post", {
+            "id": post_id,
+            "user_id": user_id,
+            "text": self.text(1, 30)[:200],
+            "publication_date": publication_date,
+            "last_modified": publication_date,
+            "activity_date": publication_date,
+        }
+
+        for liker_id in sorted(self.popular(self.amount(self.likes))):
+            yield "like", {"post_id": post_id, "user_id": liker_id}
+
+        comments = []
+        for _ in range(self.amount(self.comments)):
+            parent = None
+            if comments and self.random.random() < self.reply_ratio:
+                parent = self.random.choice(comments)
+            comment = {
+                "id": self.next_comment,
+                "post_id": post_id,
+                "user_id": self.random.choice(self.user_ids),
+                "text": self.text(1, 30)[:200],
+                "publication_date": self.date(
+                    parent["publication_date"] if parent else publication_date
+                ),
+                "reply": parent is not None,
+                "parent_comment_id": parent["id"] if parent else None,
+            }
+            self.next_comment += 1
+            comments.append(comment)
+            yield "comment", comment
+
+
+def read_jsonl(lines: Iterable[bytes]) -> Iterator[tuple[str, dict]]:
+    now = timezone.now()
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = orjson.loads(line)
+            kind = record.pop("model")
+        except (orjson.JSONDecodeError, AttributeError, KeyError) as error:
+            raise CommandError(f"Line {number}: not a record") from error
+        if kind not in MODELS:
+            raise CommandError(f"Line {number}: unknown model {kind!r}")
+
+        missing = [field for field in REQUIRED_FIELDS[kind] if record.get(field) is None]
+        if missing:
+            raise CommandError(f"Line {number}: {kind} without {', '.join(missing)}")
+        fields = {field.attname for field in MODELS[kind]._meta.concrete_fields}
+        unknown = sorted(set(record) - fields)
+        if unknown:
+            raise CommandError(f"Line {number}: unknown {kind} fields {', '.join(unknown)}")
+        for attname in AUTO_DATES[kind]:
+            if record.get(attname) is None:
+                record[attname] = now
+
+        yield kind, record
+
+
+def parse_now(value: str) -> datetime:
+    try:
+        date = datetime.fromisoformat(value)
+    except ValueError:
+        raise ArgumentTypeError(f"not an ISO 8601 date: {value!r}") from None
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date.replace(microsecond=0)
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk load a synthetic network (users, power-law follow graph, posts, likes and "
+        "comment threads), or stream one from a JSONL file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000, help="Number of users.")
+        parser.add_argument(
+            "--follows", type=float, default=20, help="Mean number of accounts followed."
+        )
+        parser.add_argument(
+            "--posts", type=float, default=10, help="Mean number of posts per user."
+        )
+        parser.add_argument("--likes", type=float, default=5, help="Mean number of likes per post.")
+        parser.add_argument(
+            "--comments", type=float, default=3, help="Mean number of comments per post."
+        )
+        parser.add_argument(
+            "--reply-ratio",
+            type=float,
+            default=0.5,
+            help="Probability of a comment being a reply to an earlier one.",
+        )
+        parser.add_argument(
+            "--skew", type=float, default=1.0, help="Exponent of the popularity power law."
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the generator.")
+        parser.add_argument(
+            "--now",
+            type=parse_now,
+            help="End of the generated dates, as an ISO 8601 date (default: 2024-01-01). "
+            "Dates are random within the year before it.",
+        )
+        parser.add_argument("--prefix", default="seed", help="Prefix of the usernames.")
+        parser.add_argument(
+            "--password", default="password", help="Password shared by every loaded user."
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Number of rows per INSERT."
+        )
+        parser.add_argument(
+            "--load",
+            metavar="PATH",
+            help="Load the records of a JSONL file ('-' for stdin) instead of generating them.",
+        )
+        parser.add_argument(
+            "--dump",
+            metavar="PATH",
+            help="Write the generated records to a JSONL file ('-' for stdout) instead of "
+            "loading them.",
+        )
+
+    def handle(self, *args, **options):
+        if options["load"] and options["dump"]:
+            raise CommandError("--load and --dump are exclusive")
+
+        if options["load"]:
+            path = options["load"]
+            lines = nullcontext(sys.stdin.buffer) if path == "-" else open(path, "rb")
+            with lines as lines:
+                self.load(read_jsonl(lines), options)
+            return
+
+        records = Generator(options)
+
+        if options["dump"]:
+            path = options["dump"]
+            out = nullcontext(sys.stdout.buffer) if path == "-" else open(path, "wb")
+            with out as out:
+                for kind, record in records:
+                    out.write(orjson.dumps({"model": kind, **record}) + b"\n")
+            return
+
+        self.load(records, options)
+
+    def load(self, records: Iterable[tuple[str, dict]], options: dict):
+        batch_size = options["batch_size"]
+        password = make_password(options["password"])
+        buffers: dict[str, list] = {kind: [] for kind in MODELS}
+        loaded = dict.fromkeys(MODELS, 0)
+        user_ids = []
+
+        def flush():
+            # Buffers are flushed together, in dependency order, so every row
+            # they refer to is already inserted
+            with transaction.atomic():
+                for kind, objects in buffers.items():
+                    MODELS[kind].objects.bulk_create(
+                        objects, batch_size=batch_size, ignore_conflicts=kind == "like"
+                    )
+                    loaded[kind] += len(objects)
+                    objects.clear()
+
+        with explicit_dates():
+            for kind, record in records:
+                if kind == "user":
+                    record.setdefault("password", password)
+                    user_ids.append(record["id"])
+                buffer = buffers[kind]
+                buffer.append(MODELS[kind](**record))
+                if len(buffer) >= batch_size:
+                    flush()
+            flush()
+
+        # Rows were inserted with explicit ids
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [User, Post, Comment]):
+                cursor.execute(sql)
+
+        for kind, total in loaded.items():
+            self.stdout.write(f"{kind}: {total} loaded")
+
+        call_command("rebuild_counters", batch_size=batch_size, stdout=self.stdout)
+
+        for start in range(0, len(user_ids), timeline.BATCH_SIZE):
+            timeline.rebuild(user_ids[start : start + timeline.BATCH_SIZE])
+        self.stdout.write(self.style.SUCCESS(f"{len(user_ids)} timelines rebuilt"))
+
+        with transaction.atomic():
+            search.rebuild()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
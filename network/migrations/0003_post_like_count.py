@@ -0,0 +1,33 @@
+# Generated by Django 4.1.5 on 2026-10-18 17:16
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_like_count(apps, schema_editor):
+    Post = apps.get_model('network', 'Post')
+    likes = (
+        Post.liked_by.through.objects.filter(post_id=OuterRef('id'))
+        .order_by()
+        .values('post_id')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Post.objects.update(like_count=Coalesce(Subquery(likes), 0, output_field=IntegerField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0002_post_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_like_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.1.5 on 2026-10-18 17:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+TIMELINE_LENGTH = 800
+
+
+def backfill_timelines(apps, schema_editor):
+    User = apps.get_model('network', 'User')
+    Post = apps.get_model('network', 'Post')
+    TimelineEntry = apps.get_model('network', 'TimelineEntry')
+    Follow = User.following.through
+
+    followers = Follow.objects.order_by().values_list('from_user_id', flat=True).distinct()
+    for follower_id in followers.iterator():
+        followed = Follow.objects.filter(from_user_id=follower_id).values('to_user_id')
+        posts = (
+            Post.objects.filter(user_id__in=followed)
+            .order_by('-publication_date', '-id')
+            .values_list('id', 'user_id', 'publication_date')[:TIMELINE_LENGTH]
+        )
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=follower_id,
+                    post_id=post_id,
+                    author_id=author_id,
+                    publication_date=publication_date,
+                )
+                for post_id, author_id, publication_date in posts
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0003_post_like_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('publication_date', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='network.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-publication_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-publication_date', '-post'], name='timeline_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'author'], name='timeline_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='timeline_unique_post'),
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.1.5 on 2026-10-18 17:19
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_comment_counters(apps, schema_editor):
+    Post = apps.get_model("network", "Post")
+    Comment = apps.get_model("network", "Comment")
+
+    comments = (
+        Comment.objects.filter(post_id=OuterRef("id"))
+        .order_by()
+        .values("post_id")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    replies = (
+        Comment.objects.filter(parent_comment_id=OuterRef("id"))
+        .order_by()
+        .values("parent_comment_id")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    Post.objects.update(
+        comment_count=Coalesce(Subquery(comments), 0, output_field=IntegerField())
+    )
+    Comment.objects.update(
+        reply_count=Coalesce(Subquery(replies), 0, output_field=IntegerField())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0004_timelineentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="reply_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["post", "parent_comment", "-publication_date", "-id"],
+                name="comment_thread_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["parent_comment", "-publication_date", "-id"],
+                name="comment_replies_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_comment_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,144 @@
+# Generated by Django 4.1.5 on 2026-10-18 17:27
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def copy_follows(apps, schema_editor):
+    """
+    Copy the edges of the implicit following table to Follow and compute the
+    follow counters.
+    """
+    User = apps.get_model("network", "User")
+    Follow = apps.get_model("network", "Follow")
+    OldFollow = User.following.through
+
+    edges = OldFollow.objects.order_by("id").values_list("from_user_id", "to_user_id")
+    Follow.objects.bulk_create(
+        (
+            Follow(follower_id=follower_id, followed_id=followed_id)
+            for follower_id, followed_id in edges.iterator(chunk_size=BATCH_SIZE)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+    def count(field):
+        total = (
+            Follow.objects.filter(**{field: OuterRef("id")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        return Coalesce(Subquery(total), 0, output_field=IntegerField())
+
+    User.objects.update(
+        following_count=count("follower_id"), followers_count=count("followed_id")
+    )
+
+
+def copy_follows_back(apps, schema_editor):
+    User = apps.get_model("network", "User")
+    Follow = apps.get_model("network", "Follow")
+    OldFollow = User.following.through
+
+    OldFollow.objects.bulk_create(
+        (
+            OldFollow(from_user_id=follower_id, to_user_id=followed_id)
+            for follower_id, followed_id in Follow.objects.values_list(
+                "follower_id", "followed_id"
+            ).iterator(chunk_size=BATCH_SIZE)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0005_comment_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="followers_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="following_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="Follow",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "followed",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "follower",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="follow",
+            index=models.Index(
+                fields=["follower", "created"], name="follow_follower_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="follow",
+            index=models.Index(
+                fields=["followed", "created"], name="follow_followed_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="follow",
+            constraint=models.UniqueConstraint(
+                fields=("follower", "followed"), name="follow_unique_edge"
+            ),
+        ),
+        # A ManyToManyField can't be altered to use a through model, the edges
+        # are copied to Follow before the implicit table is dropped
+        migrations.RunPython(copy_follows, copy_follows_back),
+        migrations.RemoveField(
+            model_name="user",
+            name="following",
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="following",
+            field=models.ManyToManyField(
+                related_name="followers",
+                through="network.Follow",
+                through_fields=("follower", "followed"),
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.1.5 on 2026-10-18 17:29
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def delete_self_follows(apps, schema_editor):
+    """
+    Self-follows were removed right after being added by a signal, drop any
+    that were left behind before adding the constraint.
+    """
+    User = apps.get_model("network", "User")
+    Follow = apps.get_model("network", "Follow")
+
+    self_follows = Follow.objects.filter(follower=F("followed"))
+    user_ids = list(self_follows.values_list("follower_id", flat=True))
+    self_follows.delete()
+    User.objects.filter(id__in=user_ids).update(
+        following_count=F("following_count") - 1,
+        followers_count=F("followers_count") - 1,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0006_follow"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_self_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="follow",
+            constraint=models.CheckConstraint(
+                check=models.Q(("follower", models.F("followed")), _negated=True),
+                name="follow_not_self",
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.1.5 on 2026-10-18 17:42
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def backfill_activity_date(apps, schema_editor):
+    Post = apps.get_model("network", "Post")
+    Post.objects.update(activity_date=F("last_modified"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0007_follow_not_self"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="activity_date",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_activity_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["activity_date", "id"], name="post_activity_idx"
+            ),
+        ),
+    ]
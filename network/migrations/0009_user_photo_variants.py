@@ -0,0 +1,18 @@
+# Generated by Django 4.1.5 on 2026-10-18 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0008_post_activity_date"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="photo_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.1.5 on 2026-10-18 18:05
+
+from django.db import migrations
+
+# The search index lives in tables the ORM doesn't manage, see network/search.py
+CREATE_SQL = {
+    "postgresql": [
+        """
+        CREATE TABLE network_post_search (
+            id bigint PRIMARY KEY REFERENCES network_post (id)
+                ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+            document tsvector NOT NULL
+        )
+        """,
+        "CREATE INDEX network_post_search_idx ON network_post_search USING GIN (document)",
+        """
+        CREATE TABLE network_user_search (
+            id bigint PRIMARY KEY REFERENCES network_user (id)
+                ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+            document tsvector NOT NULL
+        )
+        """,
+        "CREATE INDEX network_user_search_idx ON network_user_search USING GIN (document)",
+        """
+        INSERT INTO network_post_search (id, document)
+        SELECT id, to_tsvector('english', text) FROM network_post
+        """,
+        """
+        INSERT INTO network_user_search (id, document)
+        SELECT
+            id,
+            setweight(to_tsvector('simple', username), 'A')
+                || setweight(to_tsvector('simple', about), 'B')
+        FROM network_user
+        """,
+    ],
+    "sqlite": [
+        """
+        CREATE VIRTUAL TABLE network_post_search
+        USING fts5(text, tokenize = 'porter unicode61 remove_diacritics 2')
+        """,
+        """
+        CREATE VIRTUAL TABLE network_user_search
+        USING fts5(username, about, tokenize = 'porter unicode61 remove_diacritics 2')
+        """,
+        "INSERT INTO network_post_search (rowid, text) SELECT id, text FROM network_post",
+        """
+        INSERT INTO network_user_search (rowid, username, about)
+        SELECT id, username, about FROM network_user
+        """,
+    ],
+}
+
+DROP_SQL = [
+    "DROP TABLE IF EXISTS network_post_search",
+    "DROP TABLE IF EXISTS network_user_search",
+]
+
+
+def create_search_index(apps, schema_editor):
+    for sql in CREATE_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        for sql in DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0011_task"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.1.5 on 2026-10-18 19:40
+
+from django.db import migrations
+
+# FTS5 tables can't reference network_post and network_user, so on SQLite
+# triggers remove the rows of the deleted posts and users from the index.
+# PostgreSQL cascades the deletes with the foreign keys of migration 0012.
+CREATE_SQL = {
+    "sqlite": [
+        "DELETE FROM network_post_search WHERE rowid NOT IN (SELECT id FROM network_post)",
+        "DELETE FROM network_user_search WHERE rowid NOT IN (SELECT id FROM network_user)",
+        """
+        CREATE TRIGGER network_post_search_delete AFTER DELETE ON network_post
+        BEGIN
+            DELETE FROM network_post_search WHERE rowid = OLD.id;
+        END
+        """,
+        """
+        CREATE TRIGGER network_user_search_delete AFTER DELETE ON network_user
+        BEGIN
+            DELETE FROM network_user_search WHERE rowid = OLD.id;
+        END
+        """,
+    ],
+}
+
+DROP_SQL = {
+    "sqlite": [
+        "DROP TRIGGER IF EXISTS network_post_search_delete",
+        "DROP TRIGGER IF EXISTS network_user_search_delete",
+    ],
+}
+
+
+def create_delete_triggers(apps, schema_editor):
+    for sql in CREATE_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_delete_triggers(apps, schema_editor):
+    for sql in DROP_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0012_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_delete_triggers, drop_delete_triggers),
+    ]
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from collections import Counter, defaultdict
+from typing import TYPE_CHECKING, Iterable
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser, UserManager
-from django.db import models
-from django.db.models import Case, Count, Exists, OuterRef, Prefetch, QuerySet, Value, When
+from django.db import connections, models, transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, QuerySet, When
+from django.db.models.expressions import RawSQL
 from django.forms import ValidationError
+from django.utils import timezone
 
 from .utility import FileValidator, upload_path
 
@@ -20,64 +23,351 @@ if TYPE_CHECKING:
 
 class CustomUserManager(UserManager):
     def fetch_profile(self, request_user: User, username: str):
-        # select_related() only works with foreign key and one-to-one
-        # fields
-        is_owner = Case(When(user__id=request_user.id, then=True), default=False)
-        is_following = Exists(request_user.following.filter(id=OuterRef("user__id")))
-        liked_by_user = Exists(request_user.liked_posts.filter(id=OuterRef("id")))
-
-        return self.prefetch_related(
-            Prefetch(
-                "posts",
-                queryset=Post.objects.select_related()
-                .prefetch_related(
-                    Prefetch(
-                        "comments",
-                        queryset=Comment.objects.select_related().filter(reply=False),
-                    ),  # filter related "comments" inside the post QuerySet
-                )
-                .order_by("-publication_date")
-                .annotate(is_following=is_following)
-                .annotate(is_owner=is_owner)
-                .annotate(likes=Count("liked_by"))  # Doesn't work on 4.1
-                .annotate(liked_by_user=liked_by_user),
-            )
+        """
+        Profile user with the follow state of ``request_user``. The follow
+        counts are counters on the row and the posts of the profile are
+        paginated separately, see PostManager.fetch_all_posts.
+        """
+        return self.annotate(
+            is_following=Exists(
+                Follow.objects.filter(follower_id=request_user.id, followed_id=OuterRef("id"))
+            ),
         ).get(username=username)
 
+    def follow(self, follower: User, followed: User) -> bool:
+        """
+        Add the follow edge and update both counters. Returns False if
+        ``follower`` already followed ``followed``.
+        """
+        with transaction.atomic():
+            _, created = Follow.objects.get_or_create(follower=follower, followed=followed)
+            if created:
+                self._change_follow_counters(follower, followed, 1)
+
+        return created
+
+    def unfollow(self, follower: User, followed: User) -> bool:
+        """
+        Remove the follow edge and update both counters. Returns False if
+        ``follower`` didn't follow ``followed``.
+        """
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(follower=follower, followed=followed).delete()
+            if deleted:
+                self._change_follow_counters(follower, followed, -1)
+
+        return bool(deleted)
+
+    def _change_follow_counters(self, follower: User, followed: User, delta: int):
+        # A single statement, so concurrent follows lock both rows in the
+        # same order
+        self.filter(id__in=[follower.id, followed.id]).update(
+            following_count=Case(
+                When(id=follower.id, then=F("following_count") + delta),
+                default=F("following_count"),
+                output_field=models.PositiveIntegerField(),
+            ),
+            followers_count=Case(
+                When(id=followed.id, then=F("followers_count") + delta),
+                default=F("followers_count"),
+                output_field=models.PositiveIntegerField(),
+            ),
+        )
+        # Keep the instances usable by the rest of the request, e.g.
+        # timeline.is_celebrity
+        follower.following_count += delta
+        followed.followers_count += delta
+
 
 class PostManager(models.Manager):
-    def request_data(self, request_user):
-        liked_by_user = Value(False)
-        is_following = Value(False)
-        is_owner = Case(When(user__id=request_user.id, then=True), default=False)
 
-        if request_user.is_authenticated:
-            # Check if the user has liked the post in each row of the query
-            liked_by_user = Exists(request_user.liked_posts.filter(id=OuterRef("id")))
-            is_following = Exists(request_user.following.filter(id=OuterRef("user__id")))
+    def fetch_all_posts(self) -> QuerySet:
+        """
+        Rows that select the posts of a feed page. They are the same for every
+        viewer, the posts themselves are rendered by feed_cache.render_posts.
+        """
+        return self.order_by("-publication_date", "-id").values("id", "user_id", "publication_date")
 
-        return is_owner, liked_by_user, is_following
+    def fetch_following_posts(self, request_user: User) -> QuerySet:
+        # For the "since" polls, the pages of the feed are read by
+        # timeline.FollowingFeed
+        from .timeline import following_filter
 
-    def fetch_all_posts(self, request_user) -> QuerySet[Post]:
-        is_owner, liked_by_user, is_following = self.request_data(request_user)
+        return self.fetch_all_posts().filter(following_filter(request_user))
 
-        return (
-            self.select_related()
-            .prefetch_related(
-                Prefetch(
-                    "comments",
-                    queryset=Comment.objects.select_related().filter(reply=False),
-                ),  # filter related "comments" inside the post QuerySet
+    def fetch_bodies(self, post_ids: Iterable[int]) -> list[Post]:
+        """
+        Posts ready to be serialized for any viewer, with the viewer flags off.
+        """
+        posts = list(self.select_related("user").filter(id__in=post_ids))
+        for post in posts:
+            post.is_owner = False
+            post.is_following = False
+            post.liked_by_user = False
+
+        return Comment.objects.prefetch_trees(posts)
+
+    # Insert-if-absent and delete-returning on the liked_by table, with the
+    # counter updated by the same statement. PostgreSQL runs each of them in
+    # a single round trip, other backends fall back to LIKE_FALLBACK_SQL.
+    # Parameters: user id, post id, activity date, post id.
+    LIKE_SQL = {
+        "add": """
+            WITH changed AS (
+                INSERT INTO {likes} (post_id, user_id)
+                SELECT posts.id, %s FROM {posts} AS posts WHERE posts.id = %s
+                ON CONFLICT (post_id, user_id) DO NOTHING
+                RETURNING post_id
             )
-            .order_by("-publication_date")
-            .annotate(is_following=is_following)
-            .annotate(is_owner=is_owner)
-            .annotate(likes=Count("liked_by"))  # Doesn't work on 4.1
-            .annotate(liked_by_user=liked_by_user)
+            UPDATE {posts} SET
+                like_count = like_count + (SELECT COUNT(*) FROM changed),
+                activity_date = CASE
+                    WHEN EXISTS (SELECT 1 FROM changed) THEN %s ELSE activity_date
+                END
+            WHERE id = %s
+            RETURNING like_count, (SELECT COUNT(*) FROM changed), user_id
+        """,
+        "remove": """
+            WITH changed AS (
+                DELETE FROM {likes} WHERE user_id = %s AND post_id = %s
+                RETURNING post_id
+            )
+            UPDATE {posts} SET
+                like_count = like_count - (SELECT COUNT(*) FROM changed),
+                activity_date = CASE
+                    WHEN EXISTS (SELECT 1 FROM changed) THEN %s ELSE activity_date
+                END
+            WHERE id = %s
+            RETURNING like_count, (SELECT COUNT(*) FROM changed), user_id
+        """,
+    }
+    # Parameters: user id, post id
+    LIKE_FALLBACK_SQL = {
+        "add": """
+            INSERT INTO {likes} (post_id, user_id)
+            SELECT posts.id, %s FROM {posts} AS posts WHERE posts.id = %s
+            ON CONFLICT (post_id, user_id) DO NOTHING
+        """,
+        "remove": """
+            DELETE FROM {likes} WHERE user_id = %s AND post_id = %s
+        """,
+    }
+
+    def add_like(self, post_id: int, user_id: int) -> tuple[bool, int, int]:
+        """
+        Like a post and increment its like counter atomically. Liking twice is
+        a no-op. Returns whether the like was added, the new like count and
+        the id of the author of the post.
+        """
+        return self._change_like("add", post_id, user_id)
+
+    def remove_like(self, post_id: int, user_id: int) -> tuple[bool, int, int]:
+        """
+        Unlike a post and decrement its like counter atomically. Unliking twice
+        is a no-op. Returns whether the like was removed, the new like count
+        and the id of the author of the post.
+        """
+        return self._change_like("remove", post_id, user_id)
+
+    def _change_like(self, action: str, post_id: int, user_id: int) -> tuple[bool, int, int]:
+        connection = connections[self.db]
+        tables = {
+            "likes": connection.ops.quote_name(Post.liked_by.through._meta.db_table),
+            "posts": connection.ops.quote_name(Post._meta.db_table),
+        }
+
+        # Raw SQL, so the date is adapted like the ORM would store it
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+        with transaction.atomic(using=self.db), connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                sql = self.LIKE_SQL[action].format(**tables)
+                cursor.execute(sql, [user_id, post_id, now, post_id])
+                row = cursor.fetchone()
+            else:
+                sql = self.LIKE_FALLBACK_SQL[action].format(**tables)
+                cursor.execute(sql, [user_id, post_id])
+                changed = cursor.rowcount
+                sign = "+" if action == "add" else "-"
+                if changed:
+                    cursor.execute(
+                        f"UPDATE {tables['posts']} "
+                        f"SET like_count = like_count {sign} %s, activity_date = %s WHERE id = %s",
+                        [changed, now, post_id],
+                    )
+                cursor.execute(
+                    f"SELECT like_count, user_id FROM {tables['posts']} WHERE id = %s", [post_id]
+                )
+                row = cursor.fetchone()
+                row = row and (row[0], changed, row[1])
+
+        if row is None:
+            raise Post.DoesNotExist("Post matching query does not exist.")
+
+        like_count, changed, author_id = row
+        return bool(changed), like_count, author_id
+
+
+class CommentManager(models.Manager):
+    # Newest comments of each thread level kept by the preview query. The
+    # ranking is done by the database, so only the preview rows are fetched.
+    PREVIEW_SQL = """
+        WITH RECURSIVE ranked AS (
+            SELECT id, parent_comment_id, ROW_NUMBER() OVER (
+                PARTITION BY post_id, parent_comment_id
+                ORDER BY publication_date DESC, id DESC
+            ) AS position
+            FROM {table}
+            WHERE post_id IN ({post_ids})
+        ), thread AS (
+            SELECT id, 1 AS depth FROM ranked
+            WHERE {roots} AND position <= %s
+            UNION ALL
+            SELECT ranked.id, thread.depth + 1 FROM ranked
+            INNER JOIN thread ON ranked.parent_comment_id = thread.id
+            WHERE ranked.position <= %s AND thread.depth < %s
         )
+        SELECT id FROM thread
+    """
+
+    def preview_limits(self) -> tuple[int, int]:
+        return (
+            getattr(settings, "NETWORK_COMMENTS_PREVIEW", 3),
+            getattr(settings, "NETWORK_COMMENTS_PREVIEW_DEPTH", 3),
+        )
+
+    def preview(self, post_ids: list[int], root_ids: list[int] | None = None) -> QuerySet[Comment]:
+        """
+        The newest NETWORK_COMMENTS_PREVIEW comments of each thread level,
+        down to NETWORK_COMMENTS_PREVIEW_DEPTH levels. Threads start at the
+        top level comments of ``post_ids``, or at ``root_ids`` if given (the
+        roots themselves are excluded).
+        """
+        limit, depth = self.preview_limits()
+        params: list = list(post_ids)
+
+        if root_ids is None:
+            roots = "parent_comment_id IS NULL"
+        else:
+            roots = f"parent_comment_id IN ({', '.join(['%s'] * len(root_ids))})"
+            params += root_ids
+
+        sql = self.PREVIEW_SQL.format(
+            table=self.model._meta.db_table,
+            post_ids=", ".join(["%s"] * len(post_ids)),
+            roots=roots,
+        )
+        params += [limit, limit, depth]
+
+        return self.filter(id__in=RawSQL(sql, params))
+
+    def prefetch_trees(self, posts: Iterable[Post], preview: bool = True):
+        """
+        Load the comments of ``posts`` in a single query and assemble the
+        threads in memory. Top level comments are attached to each post as
+        prefetched "comments" and the replies of each comment as prefetched
+        "replies", so serializing the nested CommentOut schema doesn't query
+        the database again, however deep the threads are.
+
+        Unless ``preview`` is False, only a bounded preview of each thread is
+        loaded, the rest is paginated by the comments and replies endpoints.
+        """
+        posts = list(posts)
+        if not posts:
+            return posts
+
+        if preview:
+            comments = self.preview([post.id for post in posts])
+        else:
+            comments = self.filter(post__in=posts)
+
+        children = self._attach(comments)
+
+        top_level: defaultdict[int, list[Comment]] = defaultdict(list)
+        for comment in children[None]:
+            top_level[comment.post_id].append(comment)
+
+        for post in posts:
+            set_prefetched(post, "comments", top_level[post.id])
+
+        return posts
+
+    def prefetch_replies(self, comments: Iterable[Comment]):
+        """
+        Attach a bounded preview of the replies below each of ``comments``.
+        """
+        comments = list(comments)
+        if not comments:
+            return comments
+
+        post_ids = list({comment.post_id for comment in comments})
+        replies = self.preview(post_ids, root_ids=[comment.id for comment in comments])
+        children = self._attach(replies)
+
+        for comment in comments:
+            set_prefetched(comment, "replies", children[comment.id])
+
+        return comments
+
+    def _attach(self, comments: QuerySet[Comment]) -> defaultdict[int | None, list[Comment]]:
+        """
+        Group ``comments`` by parent and attach each group as the replies of
+        its parent. Returns the groups, keyed by parent comment id.
+        """
+        comments = comments.select_related("user").order_by("-publication_date", "-id")
+
+        children: defaultdict[int | None, list[Comment]] = defaultdict(list)
+        for comment in comments:
+            children[comment.parent_comment_id].append(comment)
+
+        for replies in list(children.values()):
+            for comment in replies:
+                set_prefetched(comment, "replies", children[comment.id])
 
-    def fetch_following_posts(self, request_user: User) -> QuerySet[Post]:
-        return self.fetch_all_posts(request_user).filter(user__in=request_user.following.all())
+        return children
+
+
+class MediaBlobManager(models.Manager):
+    def acquire(self, names: Iterable[str]):
+        """
+        Add a reference to each blob of ``names``, empty names are skipped.
+        Names stored before the content-addressed storage have no blob.
+        """
+        self._change_refs(names, 1)
+
+    def release(self, names: Iterable[str]):
+        """
+        Remove a reference to each blob of ``names``. Unreferenced blobs are
+        deleted by "manage.py gc_media", not here.
+        """
+        self._change_refs(names, -1)
+
+    def _change_refs(self, names: Iterable[str], sign: int):
+        # One UPDATE per distinct number of references to the same blob
+        by_count = defaultdict(list)
+        for name, count in Counter(name for name in names if name).items():
+            by_count[count].append(name)
+
+        now = timezone.now()
+        for count, group in by_count.items():
+            blobs = self.filter(name__in=group)
+            if sign < 0:
+                blobs = blobs.filter(ref_count__gte=count)
+            blobs.update(ref_count=F("ref_count") + sign * count, last_used=now)
+
+
+def set_prefetched(instance: models.Model, related_name: str, objects: list):
+    """
+    Store ``objects`` the way prefetch_related() does, so that
+    ``getattr(instance, related_name).all()`` returns them without a query.
+    """
+    queryset = getattr(instance, related_name).get_queryset()
+    queryset._result_cache = objects
+    queryset._prefetch_done = True
+
+    if not hasattr(instance, "_prefetched_objects_cache"):
+        instance._prefetched_objects_cache = {}
+    instance._prefetched_objects_cache[related_name] = queryset
 
 
 # endregion
@@ -100,7 +390,19 @@ class User(AbstractUser):
         validators=[file_validator],
     )
 
-    following = models.ManyToManyField("self", related_name="followers", symmetrical=False)
+    following = models.ManyToManyField(
+        "self",
+        related_name="followers",
+        symmetrical=False,
+        through="Follow",
+        through_fields=("follower", "followed"),
+    )
+    # Maintained by CustomUserManager.follow and unfollow
+    following_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    # Storage names of the resized copies of the photo, by size and format,
+    # built off the request by network/images.py
+    photo_variants = models.JSONField(default=dict, blank=True)
 
     objects: CustomUserManager = CustomUserManager()
 
@@ -135,6 +437,15 @@ class Post(models.Model):
     liked_by = models.ManyToManyField(
         settings.AUTH_USER_MODEL, related_name="liked_posts", blank=True
     )
+    # Denormalized len(liked_by), kept in sync by PostManager.add_like and
+    # PostManager.remove_like. Rebuild with "manage.py rebuild_counters".
+    like_count = models.PositiveIntegerField(default=0)
+    # Denormalized number of comments, replies included, kept in sync by
+    # Comment.save
+    comment_count = models.PositiveIntegerField(default=0)
+    # Last time the post was edited, liked, unliked or commented, read by the
+    # "since" endpoints to send the posts that changed since the last poll
+    activity_date = models.DateTimeField(default=timezone.now)
 
     # Related Fields
     # comments = ManyToOne("Comment", related_name="post")
@@ -143,6 +454,12 @@ class Post(models.Model):
 
     class Meta:
         ordering = ["-publication_date"]
+        indexes = [
+            # Keyset pagination on (publication_date, id) for the feeds
+            models.Index(fields=["-publication_date", "-id"], name="post_feed_idx"),
+            models.Index(fields=["user", "-publication_date", "-id"], name="post_user_feed_idx"),
+            models.Index(fields=["activity_date", "id"], name="post_activity_idx"),
+        ]
 
     def __str__(self):
         return f"{self.text}"
@@ -165,9 +482,23 @@ class Comment(models.Model):
     parent_comment = models.ForeignKey(
         "self", on_delete=models.CASCADE, null=True, blank=True, related_name="replies"
     )
+    # Denormalized number of direct replies, kept in sync by Comment.save
+    reply_count = models.PositiveIntegerField(default=0)
+
+    objects: CommentManager = CommentManager()
 
     class Meta:
         ordering = ["-publication_date"]
+        indexes = [
+            # Keyset pagination of the comments and replies endpoints
+            models.Index(
+                fields=["post", "parent_comment", "-publication_date", "-id"],
+                name="comment_thread_idx",
+            ),
+            models.Index(
+                fields=["parent_comment", "-publication_date", "-id"], name="comment_replies_idx"
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         self.full_clean()
@@ -175,10 +506,130 @@ class Comment(models.Model):
             if self.parent_comment.post.id != self.post.id:
                 raise ValidationError("Parent comment must be from the same post.")
             self.reply = True
-        super().save(*args, **kwargs)
+
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Post.objects.filter(id=self.post_id).update(
+                comment_count=F("comment_count") + 1, activity_date=timezone.now()
+            )
+            if self.parent_comment_id is not None:
+                Comment.objects.filter(id=self.parent_comment_id).update(
+                    reply_count=F("reply_count") + 1
+                )
 
     def __str__(self):
         return f"{self.text} - reply: {self.reply}"  # type: ignore
 
 
+class Follow(models.Model):
+    """
+    An edge of the follow graph, ``follower`` follows ``followed``.
+    """
+
+    follower_id: int
+    follower = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    followed_id: int
+    followed = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["follower", "followed"], name="follow_unique_edge"),
+            models.CheckConstraint(check=~Q(follower=F("followed")), name="follow_not_self"),
+        ]
+        # "Who does X follow" and "who follows X", scanned in either direction
+        indexes = [
+            models.Index(fields=["follower", "created"], name="follow_follower_idx"),
+            models.Index(fields=["followed", "created"], name="follow_followed_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.follower} -> {self.followed}"
+
+
+class TimelineEntry(models.Model):
+    """
+    A post fanned out to the home timeline of one of its author's followers.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="timeline"
+    )
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="+")
+    # Copies of post.user and post.publication_date, so eviction and
+    # ordering never have to join the Post table
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    publication_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-publication_date"]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "post"], name="timeline_unique_post"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-publication_date", "-post"], name="timeline_user_idx"),
+            models.Index(fields=["user", "author"], name="timeline_author_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.post}"
+
+
+class MediaBlob(models.Model):
+    """
+    A file of the content-addressed storage (network/storage.py) and the
+    number of references to it, in User.photo and User.photo_variants.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    # Last time the blob was stored or its references changed, unreferenced
+    # blobs are kept for a grace period after it
+    last_used = models.DateTimeField(default=timezone.now)
+
+    objects: MediaBlobManager = MediaBlobManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["ref_count", "last_used"], name="mediablob_gc_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
+
+
+class Task(models.Model):
+    """
+    A task queued in database mode, see network/tasks.py. Tasks are deleted
+    once they succeed.
+    """
+
+    name = models.CharField(max_length=255)
+    kwargs = models.JSONField(default=dict)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    # Set while a worker runs the task
+    locked_until = models.DateTimeField(null=True, blank=True)
+    # Set once the retries are exhausted, failed tasks are kept for inspection
+    failed = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["failed", "run_after", "id"], name="task_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name}({self.kwargs})"
+
+
 # endregion
@@ -0,0 +1,311 @@
+"""
+Opt-in profiling of the API requests, enabled by NETWORK_API_PROFILING.
+
+Each API request is split into:
+  - db: time spent executing SQL, with the number of queries and how many of
+    them repeated an earlier query of the request;
+  - view: the endpoint function, SQL and ORM hydration included;
+  - validation: the response schemas (PostOut, CommentOut, ...) turning the
+    view result into plain data;
+  - render: ORJSONRenderer serializing that data.
+
+The timings are sent back in a Server-Timing header and aggregated per
+endpoint in the cache, see the api_profile command and the profiling
+endpoint. With the default local memory cache the stats are per process, use
+a shared cache to aggregate them across workers.
+"""
+
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.urls import reverse
+
+STATS_KEY = "network:profiling:stats"
+
+
+def enabled() -> bool:
+    return getattr(settings, "NETWORK_API_PROFILING", False)
+
+
+class _RowCounter:
+    """
+    DB-API cursor proxy counting the rows fetched through it.
+    """
+
+    def __init__(self, cursor, counter: "QueryCounter"):
+        self.cursor = cursor
+        self.counter = counter
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        for row in self.cursor:
+            self.counter.rows += 1
+            yield row
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.counter.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self.cursor.fetchmany(*args, **kwargs)
+        self.counter.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.counter.rows += len(rows)
+        return rows
+
+
+class QueryCounter:
+    """
+    Count the queries run inside the block, the time spent executing them,
+    the rows they returned and the repeated ones.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self.duplicates = 0
+        self.seconds = 0.0
+        self._seen = set()
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+
+        statement = (sql, repr(params))
+        if statement in self._seen:
+            self.duplicates += 1
+        self._seen.add(statement)
+
+        cursor = context["cursor"]
+        if not isinstance(cursor.cursor, _RowCounter):
+            cursor.cursor = _RowCounter(cursor.cursor, self)
+
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += perf_counter() - start
+
+
+class RequestProfile:
+    def __init__(self):
+        self.start = perf_counter()
+        self.queries = QueryCounter()
+        self.view = 0.0
+        self.view_end = None
+        self.validation = 0.0
+        self.render = 0.0
+        self.total = 0.0
+
+    def timings(self) -> dict[str, float]:
+        """
+        Durations in milliseconds.
+        """
+        return {
+            "db": self.queries.seconds * 1000,
+            "view": self.view * 1000,
+            "validation": self.validation * 1000,
+            "render": self.render * 1000,
+            "total": self.total * 1000,
+        }
+
+    def server_timing(self) -> str:
+        timings = self.timings()
+        db = (
+            f'db;dur={timings["db"]:.2f};'
+            f'desc="{self.queries.queries} queries, {self.queries.duplicates} duplicates"'
+        )
+        phases = (f"{name};dur={timings[name]:.2f}" for name in ("view", "validation", "render"))
+        return ", ".join([db, *phases, f'total;dur={timings["total"]:.2f}'])
+
+
+def _profile(request) -> RequestProfile | None:
+    return getattr(request, "api_profile", None)
+
+
+def timed_view(view_func):
+    """
+    Time the endpoint function and mark where the response validation starts.
+    """
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        profile = _profile(request)
+        if profile is None:
+            return view_func(request, *args, **kwargs)
+
+        start = perf_counter()
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            profile.view_end = perf_counter()
+            profile.view += profile.view_end - start
+
+    wrapper.profiled = True
+    return wrapper
+
+
+def instrument(api):
+    """
+    Wrap the endpoint functions of ``api`` with timed_view.
+    """
+    for path_view in api.default_router.path_operations.values():
+        for operation in path_view.operations:
+            if not getattr(operation.view_func, "profiled", False):
+                operation.view_func = timed_view(operation.view_func)
+
+
+@contextmanager
+def rendering(request):
+    """
+    Time the rendering of a response, and the validation that happened
+    between the end of the view and the rendering.
+    """
+    profile = _profile(request)
+    start = perf_counter()
+    if profile and profile.view_end:
+        profile.validation += start - profile.view_end
+
+    try:
+        yield
+    finally:
+        if profile:
+            profile.render += perf_counter() - start
+
+
+# Counters of each endpoint, times are stored in microseconds so they can be
+# incremented atomically
+COUNTERS = ("requests", "queries", "duplicates", "db", "view", "validation", "render", "total")
+# Number of endpoints profiled, they are stored in numbered slots
+ENDPOINTS_KEY = f"{STATS_KEY}:endpoints"
+
+
+def _key(endpoint: str, counter: str) -> str:
+    return f"{STATS_KEY}:{endpoint}:{counter}"
+
+
+def _slot_key(slot: int) -> str:
+    return f"{STATS_KEY}:slot:{slot}"
+
+
+def _incr(key: str, delta: int) -> int:
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # First increment, add is a no-op if a concurrent request won
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key, delta)
+
+
+def record(endpoint: str, profile: RequestProfile):
+    """
+    Add a request to the aggregated stats of its endpoint. Each counter is
+    incremented atomically, so concurrent requests don't overwrite each
+    other's counts. Only the maximum is a read-modify-write, it may miss a
+    slower request that finishes at the same time.
+    """
+    if cache.add(_key(endpoint, "requests"), 0, timeout=None):
+        # Only the first request of an endpoint registers it
+        cache.set(_slot_key(_incr(ENDPOINTS_KEY, 1)), endpoint, timeout=None)
+
+    timings = profile.timings()
+    values = {
+        "requests": 1,
+        "queries": profile.queries.queries,
+        "duplicates": profile.queries.duplicates,
+        **{name: round(ms * 1000) for name, ms in timings.items()},
+    }
+    for counter, value in values.items():
+        _incr(_key(endpoint, counter), value)
+
+    max_key = _key(endpoint, "max")
+    if values["total"] > cache.get(max_key, 0):
+        cache.set(max_key, values["total"], timeout=None)
+
+
+def _endpoints() -> list[str]:
+    slots = [_slot_key(slot) for slot in range(1, (cache.get(ENDPOINTS_KEY) or 0) + 1)]
+    return list(cache.get_many(slots).values())
+
+
+def stats() -> dict[str, dict]:
+    """
+    Aggregated stats of each endpoint, with the totals averaged per request.
+    """
+    averaged = {}
+    for endpoint in _endpoints():
+        keys = {_key(endpoint, counter): counter for counter in (*COUNTERS, "max")}
+        entry = {keys[key]: value for key, value in cache.get_many(keys).items()}
+        requests = entry.get("requests")
+        if not requests:
+            continue
+
+        averaged[endpoint] = {
+            "requests": requests,
+            "max_ms": round(entry.get("max", 0) / 1000, 3),
+            "avg_queries": round(entry.get("queries", 0) / requests, 3),
+            "avg_duplicates": round(entry.get("duplicates", 0) / requests, 3),
+            **{
+                f"avg_{name}_ms": round(entry.get(name, 0) / requests / 1000, 3)
+                for name in ("db", "view", "validation", "render", "total")
+            },
+        }
+
+    return averaged
+
+
+def reset():
+    keys = [_key(endpoint, counter) for endpoint in _endpoints() for counter in (*COUNTERS, "max")]
+    slots = [_slot_key(slot) for slot in range(1, (cache.get(ENDPOINTS_KEY) or 0) + 1)]
+    cache.delete_many([*keys, *slots, ENDPOINTS_KEY])
+
+
+class ApiProfilingMiddleware:
+    """
+    Profile the requests to the API, see the module docstring.
+    """
+
+    def __init__(self, get_response):
+        if not enabled():
+            raise MiddlewareNotUsed
+
+        from .api_views import api
+
+        instrument(api)
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith(reverse("network:api:api-root")):
+            return self.get_response(request)
+
+        request.api_profile = profile = RequestProfile()
+        with profile.queries:
+            response = self.get_response(request)
+        profile.total = perf_counter() - profile.start
+
+        response["Server-Timing"] = profile.server_timing()
+
+        match = request.resolver_match
+        if match:
+            record(match.url_name or match.route, profile)
+
+        return response
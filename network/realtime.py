@@ -0,0 +1,334 @@
+"""
+Server-Sent Events stream of the feed changes, served by the ASGI app
+(project4/asgi.py) at STREAM_PATH.
+
+Clients subscribe to one scope with the ``scope`` query parameter:
+  - global: every post, the all_posts feed;
+  - following: the posts of the accounts followed by the logged in user;
+  - post: a single post, given by the ``post`` query parameter.
+
+The views publish new_post, edit_post, like and new_comment events once
+their transaction commits. Each event is sent to the "global" channel, the
+channel of the post author and the channel of the post, through the broker
+set in NETWORK_BROKER. InProcessBroker only reaches the clients streaming
+from the same process, use RedisBroker (or any class with the same methods)
+when running more than one worker.
+"""
+
+import asyncio
+from functools import cache
+from importlib import import_module
+from io import BytesIO
+from threading import Lock
+
+import orjson
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Comment, Follow, Post
+
+STREAM_PATH = "/api/stream"
+# Sent when no event was sent for this long, so proxies keep the stream open
+KEEPALIVE_SECONDS = 15
+KEEPALIVE = b": keepalive\n\n"
+# Events buffered for a slow client before new ones are dropped
+QUEUE_SIZE = 100
+
+# --------------------
+# region Brokers
+# --------------------
+
+
+class InProcessBroker:
+    """
+    Broker of the clients streaming from this process.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._queues: dict[str, set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    def publish(self, channel: str, message: bytes):
+        # Called from the views, which may not run in the loop of the stream
+        with self._lock:
+            subscribers = list(self._queues.get(channel, ()))
+
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_put, queue, message)
+
+    async def subscribe(self, channels: list[str]) -> "QueueSubscription":
+        subscription = QueueSubscription(self, channels)
+        with self._lock:
+            for channel in channels:
+                self._queues.setdefault(channel, set()).add(subscription.key)
+
+        return subscription
+
+    def unsubscribe(self, subscription: "QueueSubscription"):
+        with self._lock:
+            for channel in subscription.channels:
+                queues = self._queues.get(channel, set())
+                queues.discard(subscription.key)
+                if not queues:
+                    self._queues.pop(channel, None)
+
+
+def _put(queue: asyncio.Queue, message: bytes):
+    if not queue.full():
+        queue.put_nowait(message)
+
+
+class QueueSubscription:
+    def __init__(self, broker: InProcessBroker, channels: list[str]):
+        self.broker = broker
+        self.channels = channels
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.key = (asyncio.get_running_loop(), self.queue)
+
+    async def get(self, timeout: float) -> bytes | None:
+        """
+        The next message, or None if there was none for ``timeout`` seconds.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        self.broker.unsubscribe(self)
+
+
+class RedisBroker:
+    """
+    Broker on Redis pub/sub, or any server speaking its protocol, at
+    NETWORK_BROKER_URL. Requires the redis package.
+    """
+
+    prefix = "network:"
+
+    def __init__(self):
+        try:
+            import redis
+        except ImportError as error:
+            raise ImproperlyConfigured("RedisBroker requires the redis package.") from error
+
+        self.url = settings.NETWORK_BROKER_URL
+        self.client = redis.Redis.from_url(self.url)
+
+    def publish(self, channel: str, message: bytes):
+        self.client.publish(self.prefix + channel, message)
+
+    async def subscribe(self, channels: list[str]) -> "RedisSubscription":
+        from redis import asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(*(self.prefix + channel for channel in channels))
+
+        return RedisSubscription(client, pubsub)
+
+
+class RedisSubscription:
+    def __init__(self, client, pubsub):
+        self.client = client
+        self.pubsub = pubsub
+
+    async def get(self, timeout: float) -> bytes | None:
+        message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        return message["data"] if message else None
+
+    async def close(self):
+        await self.pubsub.close()
+        await self.client.close()
+
+
+@cache
+def _broker(path: str):
+    return import_string(path)()
+
+
+def get_broker():
+    return _broker(settings.NETWORK_BROKER)
+
+
+# endregion
+
+# --------------------
+# region Events
+# --------------------
+
+
+def event_message(event: str, data: dict) -> bytes:
+    """
+    A Server-Sent Event, with the data rendered like the API responses.
+    """
+    data = orjson.dumps(data, option=orjson.OPT_UTC_Z | orjson.OPT_OMIT_MICROSECONDS)
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+
+def publish(event: str, data: dict, post_id: int, author_id: int):
+    """
+    Send an event about a post once the current transaction commits.
+    """
+    message = event_message(event, data)
+    channels = ["global", f"author:{author_id}", f"post:{post_id}"]
+
+    def send():
+        broker = get_broker()
+        for channel in channels:
+            broker.publish(channel, message)
+
+    transaction.on_commit(send)
+
+
+def post_created(post: Post):
+    data = {
+        "id": post.id,
+        "username": post.user.username,
+        "text": post.text,
+        "publicationDate": post.publication_date,
+    }
+    publish("new_post", data, post.id, post.user_id)
+
+
+def post_edited(post: Post):
+    data = {"id": post.id, "text": post.text, "lastModified": post.last_modified}
+    publish("edit_post", data, post.id, post.user_id)
+
+
+def likes_changed(post_id: int, author_id: int, likes: int):
+    # The author comes from PostManager.add_like or remove_like, which
+    # return it with the like count
+    publish("like", {"id": post_id, "likes": likes}, post_id, author_id)
+
+
+def comment_created(comment: Comment, comment_count: int):
+    data = {
+        "id": comment.id,
+        "postId": comment.post_id,
+        "parentId": comment.parent_comment_id,
+        "username": comment.user.username,
+        "text": comment.text,
+        "publicationDate": comment.publication_date,
+        "commentCount": comment_count,
+    }
+    publish("new_comment", data, comment.post_id, comment.post.user_id)
+
+
+# endregion
+
+# --------------------
+# region Stream
+# --------------------
+
+
+def _user(request: ASGIRequest):
+    """
+    The user of the session cookie, like SessionMiddleware and
+    AuthenticationMiddleware would set it.
+    """
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    return get_user(request)
+
+
+def _channels(request: ASGIRequest) -> tuple[int, list[str] | str]:
+    """
+    The channels of the requested scope, or an error status and message.
+    """
+    scope = request.GET.get("scope", "global")
+
+    if scope == "global":
+        return 200, ["global"]
+
+    if scope == "post":
+        post_id = request.GET.get("post", "")
+        if not post_id.isdigit() or not Post.objects.filter(id=post_id).exists():
+            return 404, "The requested object does not exist."
+        return 200, [f"post:{post_id}"]
+
+    if scope == "following":
+        user = _user(request)
+        if not user.is_authenticated:
+            return 401, "Unauthorized"
+        followed = Follow.objects.filter(follower=user).values_list("followed_id", flat=True)
+        return 200, [f"author:{user_id}" for user_id in followed]
+
+    return 400, f"Unknown scope {scope}."
+
+
+async def _send_error(send, status: int, message: str):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send({"type": "http.response.body", "body": orjson.dumps({"errors": message})})
+
+
+async def _disconnected(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def stream(scope, receive, send):
+    """
+    ASGI app streaming the events of a scope until the client disconnects.
+    """
+    request = ASGIRequest(scope, BytesIO())
+    status, channels = await sync_to_async(_channels)(request)
+    if status != 200:
+        return await _send_error(send, status, channels)
+
+    subscription = await get_broker().subscribe(channels)
+    disconnected = asyncio.ensure_future(_disconnected(receive))
+    try:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    # Don't let nginx buffer the events
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": KEEPALIVE, "more_body": True})
+
+        while True:
+            message = asyncio.ensure_future(subscription.get(KEEPALIVE_SECONDS))
+            await asyncio.wait({message, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                message.cancel()
+                break
+
+            body = message.result() or KEEPALIVE
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    finally:
+        disconnected.cancel()
+        await subscription.close()
+
+
+def mount(django_app):
+    """
+    Serve the stream at STREAM_PATH in front of the Django ASGI app.
+    """
+
+    async def application(scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == STREAM_PATH:
+            return await stream(scope, receive, send)
+        return await django_app(scope, receive, send)
+
+    return application
+
+
+# endregion
@@ -7,6 +7,7 @@ from re import search
 from ninja import Field, ModelSchema, Schema
 from pydantic import constr, validator
 
+from .images import variant_urls
 from .models import Comment, Post, User
 
 
@@ -27,12 +28,15 @@ def must_not_be_html(string):
 
 class UserOut(ModelSchema):
     # "..." means the field is required
-    lastLogin: datetime = Field(..., alias="last_login")
+    # Users created by seed_network or the admin may have never logged in
+    lastLogin: datetime | None = Field(..., alias="last_login")
     dateJoined: datetime = Field(..., alias="date_joined")
-    followingCount: int = Field(..., alias="following.count")
-    followersCount: int = Field(..., alias="followers.count")
+    followingCount: int = Field(..., alias="following_count")
+    followersCount: int = Field(..., alias="followers_count")
     isFollowing: bool = Field(..., alias="is_following")
     postsData: PaginatedPosts = Field(..., alias="posts_data")
+    # URLs of the resized photos by size and format, empty until they are built
+    photoVariants: dict[str, dict[str, str]]
 
     class Config:
         model = User
@@ -43,6 +47,10 @@ class UserOut(ModelSchema):
             "email",
         ]
 
+    @staticmethod
+    def resolve_photoVariants(obj):
+        return variant_urls(obj.photo_variants)
+
 
 class UserProfileIn(Schema):
     username: constr(strip_whitespace=True, min_length=3, max_length=20)  # type: ignore
@@ -51,10 +59,30 @@ class UserProfileIn(Schema):
 
 
 class UserProfileOut(ModelSchema):
+    photoVariants: dict[str, dict[str, str]]
+
     class Config:
         model = User
         model_fields = ["username", "email", "photo", "about"]
 
+    @staticmethod
+    def resolve_photoVariants(obj):
+        return variant_urls(obj.photo_variants)
+
+
+class FollowUserOut(ModelSchema):
+    isFollowing: bool = Field(..., alias="is_following")
+    followersCount: int = Field(..., alias="followers_count")
+
+    class Config:
+        model = User
+        model_fields = ["username", "photo", "about"]
+
+
+class PaginatedUsers(Schema):
+    nextCursor: str | None = None
+    users: list[FollowUserOut]
+
 
 # endregion
 
@@ -82,15 +110,19 @@ class PostOut(ModelSchema):
     username: str = Field(..., alias="user.username")
     isFollowing: bool = Field(..., alias="is_following")
     isOwner: bool = Field(..., alias="is_owner")
-    likes: int = Field(None, alias="likes")
+    likes: int = Field(None, alias="like_count")
     likedByUser: bool = Field(False, alias="liked_by_user")
     publicationDate: datetime = Field(..., alias="publication_date")
     lastModified: datetime = Field(..., alias="last_modified")
+    # Only a preview of the threads, see CommentManager.preview
     comments: list[CommentOut] = Field(..., alias="comments")
+    commentCount: int = Field(0, alias="comment_count")
 
     class Config:
         model = Post
         model_fields = ["id", "text", "edited"]
+        # Posts rendered from the feed cache are already keyed by field name
+        allow_population_by_field_name = True
 
 
 class EditedPost(ModelSchema):
@@ -102,12 +134,38 @@ class EditedPost(ModelSchema):
 
 
 class PaginatedPosts(Schema):
-    numPages: int
+    # numPages is not computed in cursor mode, which never counts the rows
+    numPages: int | None = None
     previousPage: int | None = None
     nextPage: int | None = None
+    nextCursor: str | None = None
     posts: list[PostOut]
 
 
+class PostUpdate(Schema):
+    """
+    The fields of a post that change after it's published.
+    """
+
+    id: int
+    text: str
+    edited: bool
+    likes: int = Field(..., alias="like_count")
+    commentCount: int = Field(..., alias="comment_count")
+    lastModified: datetime = Field(..., alias="last_modified")
+
+
+class PostsSince(Schema):
+    # Only the count of new posts is sent in count mode
+    count: int | None = None
+    hasMore: bool = False
+    # Cursor of the newest post sent, for the next poll
+    cursor: str | None = None
+    activityCursor: str | None = None
+    posts: list[PostOut] = []
+    updates: list[PostUpdate] = []
+
+
 # endregion
 # ----------
 # region Comment
@@ -126,10 +184,17 @@ class CommentOut(ModelSchema):
     username: str = Field(..., alias="user.username")
     publicationDate: datetime = Field(..., alias="publication_date")
     replies: list[CommentOut] = Field(..., alias="replies")
+    replyCount: int = Field(0, alias="reply_count")
 
     class Config:
         model = Comment
         model_fields = ["id", "text"]
+        allow_population_by_field_name = True
+
+
+class PaginatedComments(Schema):
+    nextCursor: str | None = None
+    comments: list[CommentOut]
 
 
 # endregion
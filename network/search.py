@@ -0,0 +1,230 @@
+"""
+Full-text search over the posts and the users.
+
+The index is an inverted index in side tables the ORM doesn't manage,
+created by migration 0012: a tsvector column with a GIN index on
+PostgreSQL, an FTS5 virtual table on SQLite. Its rows have the id of the
+post or user they index, so a search never scans the Post or User tables.
+
+The views keep the index up to date in the transaction of their write
+(index_post, index_user). Rows written around them, like the ones of
+seed_network, are indexed by rebuild. Deleted posts and users leave the
+index with them: foreign keys cascade on PostgreSQL, triggers of migration
+0013 delete them on SQLite.
+
+Results are ranked by relevance (ts_rank_cd, or bm25 on SQLite), newest
+first on ties, and paginated with a cursor on (score, id). Scores depend on
+the whole index, so pages fetched while posts are indexed may overlap.
+"""
+
+import re
+
+from django.db import NotSupportedError, connection
+
+from .models import Post, User
+from .pagination import PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor
+
+# Longer queries are truncated, every term is a lookup in the index
+MAX_TERMS = 8
+
+# Range of the ids in the cursors, a bigint on every backend
+MIN_ID = -(2**63)
+MAX_ID = 2**63 - 1
+
+# Parameters: id, text of the post
+INDEX_POST_SQL = {
+    "postgresql": [
+        """
+        INSERT INTO network_post_search (id, document)
+        VALUES (%s, to_tsvector('english', %s))
+        ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document
+        """,
+    ],
+    "sqlite": [
+        "DELETE FROM network_post_search WHERE rowid = %s",
+        "INSERT INTO network_post_search (rowid, text) VALUES (%s, %s)",
+    ],
+}
+# Parameters: id, username, about
+INDEX_USER_SQL = {
+    "postgresql": [
+        """
+        INSERT INTO network_user_search (id, document)
+        VALUES (
+            %s,
+            setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B')
+        )
+        ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document
+        """,
+    ],
+    "sqlite": [
+        "DELETE FROM network_user_search WHERE rowid = %s",
+        "INSERT INTO network_user_search (rowid, username, about) VALUES (%s, %s, %s)",
+    ],
+}
+
+# The matches of a query with their score, higher is better. Parameters:
+# the query returned by match_query. ts_rank_cd returns a real, cast to the
+# double precision of the cursors so the comparisons with them are exact
+MATCH_SQL = {
+    "posts": {
+        "postgresql": """
+            SELECT search.id, ts_rank_cd(search.document, query)::float8 AS score
+            FROM network_post_search AS search, to_tsquery('english', %s) AS query
+            WHERE search.document @@ query
+        """,
+        "sqlite": """
+            SELECT rowid AS id, -bm25(network_post_search) AS score
+            FROM network_post_search
+            WHERE network_post_search MATCH %s
+        """,
+    },
+    "users": {
+        "postgresql": """
+            SELECT search.id, ts_rank_cd(search.document, query)::float8 AS score
+            FROM network_user_search AS search, to_tsquery('simple', %s) AS query
+            WHERE search.document @@ query
+        """,
+        # Matches in the username weigh more than in the about text
+        "sqlite": """
+            SELECT rowid AS id, -bm25(network_user_search, 10.0, 1.0) AS score
+            FROM network_user_search
+            WHERE network_user_search MATCH %s
+        """,
+    },
+}
+
+REBUILD_SQL = {
+    "postgresql": [
+        "DELETE FROM network_post_search",
+        """
+        INSERT INTO network_post_search (id, document)
+        SELECT id, to_tsvector('english', text) FROM network_post
+        """,
+        "DELETE FROM network_user_search",
+        """
+        INSERT INTO network_user_search (id, document)
+        SELECT
+            id,
+            setweight(to_tsvector('simple', username), 'A')
+                || setweight(to_tsvector('simple', about), 'B')
+        FROM network_user
+        """,
+    ],
+    "sqlite": [
+        "DELETE FROM network_post_search",
+        "INSERT INTO network_post_search (rowid, text) SELECT id, text FROM network_post",
+        "DELETE FROM network_user_search",
+        """
+        INSERT INTO network_user_search (rowid, username, about)
+        SELECT id, username, about FROM network_user
+        """,
+    ],
+}
+
+
+def _vendor_sql(queries: dict):
+    try:
+        return queries[connection.vendor]
+    except KeyError:
+        raise NotSupportedError(f"Search is not supported on {connection.vendor}") from None
+
+
+def _execute(statements: list[str], params: list):
+    with connection.cursor() as cursor:
+        for sql in statements:
+            # Each statement of a vendor takes a prefix of the parameters
+            cursor.execute(sql, params[: sql.count("%s")])
+
+
+# --------------------
+# region Indexing
+# --------------------
+
+
+def index_post(post: Post):
+    _execute(_vendor_sql(INDEX_POST_SQL), [post.id, post.text])
+
+
+def index_user(user: User):
+    _execute(_vendor_sql(INDEX_USER_SQL), [user.id, user.username, user.about])
+
+
+def rebuild():
+    """
+    Index every post and user again.
+    """
+    with connection.cursor() as cursor:
+        for sql in _vendor_sql(REBUILD_SQL):
+            cursor.execute(sql)
+
+
+# endregion
+
+# --------------------
+# region Queries
+# --------------------
+
+
+def terms(query: str) -> list[str]:
+    """
+    The words of a search, without the operators of the query syntaxes.
+    """
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def match_query(words: list[str]) -> str:
+    """
+    A query that matches the rows with all of ``words``, the last one as a
+    prefix, so results show up while the last word is typed.
+    """
+    if connection.vendor == "postgresql":
+        return " & ".join(words) + ":*"
+
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+def search(kind: str, query: str, cursor: str | None, size: int = PAGE_SIZE):
+    """
+    Ids of a page of the ``kind`` ("posts" or "users") that match ``query``,
+    best match first, starting after ``cursor``.
+
+    Returns the ids and the cursor of the next page, if there is one.
+    """
+    words = terms(query)
+    if not words:
+        return [], None
+
+    sql = f"SELECT id, score FROM ({_vendor_sql(MATCH_SQL[kind])}) AS matches"
+    params = [match_query(words)]
+
+    if cursor:
+        score, last_id = decode_cursor(cursor, 2)
+        if (
+            # Scores are always encoded as floats
+            not isinstance(score, float)
+            or not isinstance(last_id, int)
+            or isinstance(last_id, bool)
+            or not MIN_ID <= last_id <= MAX_ID
+        ):
+            raise InvalidCursor(cursor)
+        sql += " WHERE score < %s OR (score = %s AND id < %s)"
+        params += [score, score, last_id]
+
+    sql += " ORDER BY score DESC, id DESC LIMIT %s"
+    params.append(size + 1)
+
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        last_id, score = rows[-1]
+        next_cursor = encode_cursor(score, last_id)
+
+    return [row_id for row_id, _ in rows], next_cursor
+
+
+# endregion
@@ -0,0 +1,67 @@
+import os
+from hashlib import sha256
+from tempfile import NamedTemporaryFile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils import timezone
+
+from .utility import app_name
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage naming each file after the sha256 of its content,
+    with the extension of the name it was saved with. Saving a file that is
+    already stored doesn't write it again, identical uploads share one file.
+
+    Each stored file has a MediaBlob row. Its references are counted by
+    MediaBlob.objects.acquire and release, and the unreferenced files are
+    deleted in batches by "manage.py gc_media".
+    """
+
+    directory = f"{app_name}/blobs"
+
+    def blob_name(self, name: str, digest: str) -> str:
+        extension = os.path.splitext(name)[1].lower()
+        # Two levels, so no directory holds every file
+        return f"{self.directory}/{digest[:2]}/{digest}{extension}"
+
+    def get_available_name(self, name, max_length=None):
+        # A name is only taken by the same content
+        return name
+
+    def _save(self, name, content):
+        from .models import MediaBlob
+
+        digest = sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        name = self.blob_name(name, digest.hexdigest())
+
+        # The row is locked before the file is checked, so gc_media can't
+        # delete the file between the check and the update of the row
+        with transaction.atomic():
+            MediaBlob.objects.update_or_create(
+                name=name, defaults={"size": content.size, "last_used": timezone.now()}
+            )
+            if not self.exists(name):
+                self._write(name, content)
+
+        return name
+
+    def _write(self, name: str, content):
+        """
+        Write to a temporary file moved into place, so concurrent saves of the
+        same content never expose a partial file.
+        """
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        with NamedTemporaryFile(dir=directory, delete=False) as temporary:
+            for chunk in content.chunks():
+                temporary.write(chunk)
+
+        os.chmod(temporary.name, self.file_permissions_mode or 0o644)
+        os.replace(temporary.name, path)
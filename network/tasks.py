@@ -0,0 +1,193 @@
+"""
+Background tasks for the side effects of the views, so requests only pay
+for their primary write.
+
+A task is a function decorated with @task, called with JSON serializable
+keyword arguments through ``.delay()``. How it runs depends on
+NETWORK_TASKS_MODE:
+  - thread: once the transaction commits, in a pool of NETWORK_TASKS_WORKERS
+    threads of the same process. Nothing to run besides the web server, but
+    the tasks queued when a process stops are lost, so it's only the default
+    with DEBUG;
+  - database: a Task row is inserted in the current transaction, so it's
+    queued if and only if the write commits, and "manage.py run_tasks" runs
+    it. Works on SQLite and PostgreSQL, no broker is needed. The default in
+    production, as no task is lost on a restart;
+  - sync: right away, in the caller. Used by the tests.
+
+Failed tasks are retried with an exponential backoff, ``retries`` times.
+Tasks must be idempotent: they may run again after a worker crash, and the
+identical tasks claimed in the same batch run once.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Timer
+
+import orjson
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# Delay before the first retry of a task, doubled on each retry
+RETRY_DELAY = timedelta(seconds=10)
+
+_executor = None
+
+
+def mode() -> str:
+    return getattr(settings, "NETWORK_TASKS_MODE", "thread")
+
+
+def executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.NETWORK_TASKS_WORKERS, thread_name_prefix="network-tasks"
+        )
+    return _executor
+
+
+class RegisteredTask:
+    def __init__(self, func, retries: int):
+        self.func = func
+        self.retries = retries
+        self.name = f"{func.__module__}.{func.__name__}"
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, **kwargs):
+        """
+        Queue the task, see the module docstring.
+        """
+        current = mode()
+
+        if current == "sync":
+            self.func(**kwargs)
+        elif current == "database":
+            Task.objects.create(name=self.name, kwargs=kwargs)
+        else:
+            transaction.on_commit(lambda: executor().submit(self._run_in_thread, kwargs))
+
+    def _run_in_thread(self, kwargs: dict, attempt: int = 0):
+        try:
+            with transaction.atomic():
+                self.func(**kwargs)
+        except Exception:
+            if attempt == self.retries:
+                logger.exception("Task %s failed with %s", self.name, kwargs)
+            else:
+                logger.warning("Task %s failed with %s, retrying", self.name, kwargs)
+                # Submitted again after the delay, the workers of the pool
+                # don't wait for it
+                delay = (RETRY_DELAY * 2**attempt).total_seconds()
+                retry = Timer(
+                    delay, executor().submit, args=(self._run_in_thread, kwargs, attempt + 1)
+                )
+                retry.daemon = True
+                retry.start()
+        finally:
+            # Worker threads have their own connections
+            connections.close_all()
+
+
+def task(retries: int = 3):
+    """
+    Register a function as a task. The function must be defined at the top
+    level of a module, the workers import it by name.
+    """
+
+    def decorator(func) -> RegisteredTask:
+        return RegisteredTask(func, retries)
+
+    return decorator
+
+
+# --------------------
+# region Worker
+# --------------------
+
+
+def claim(batch_size: int, lease: timedelta) -> list[Task]:
+    """
+    Lock the next ``batch_size`` tasks that are due for ``lease``, after which
+    they can be claimed again if the worker didn't finish them.
+    """
+    now = timezone.now()
+    due = Task.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now), failed=False, run_after__lte=now
+    )
+
+    with transaction.atomic():
+        # Concurrent workers skip each other's rows on PostgreSQL, SQLite
+        # serializes the transactions
+        ids = list(
+            due.select_for_update(skip_locked=True)
+            .order_by("run_after", "id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        Task.objects.filter(id__in=ids).update(locked_until=now + lease)
+
+    return list(Task.objects.filter(id__in=ids).order_by("run_after", "id"))
+
+
+def run_batch(batch_size: int = 50, lease: timedelta = timedelta(minutes=5)) -> dict[str, int]:
+    """
+    Run the next batch of queued tasks. Returns how many tasks succeeded, were
+    retried and failed for good.
+    """
+    groups = {}
+    for queued in claim(batch_size, lease):
+        key = (queued.name, orjson.dumps(queued.kwargs, option=orjson.OPT_SORT_KEYS))
+        groups.setdefault(key, []).append(queued)
+
+    result = {"done": 0, "retried": 0, "failed": 0}
+    for (name, _), queued in groups.items():
+        try:
+            registered = import_string(name)
+        except ImportError as error:
+            # The task was renamed or removed, it can't succeed
+            for row in queued:
+                result[_fail(row, 0, error)] += 1
+            continue
+
+        try:
+            with transaction.atomic():
+                registered.func(**queued[0].kwargs)
+        except Exception as error:
+            logger.exception("Task %s failed with %s", name, queued[0].kwargs)
+            for row in queued:
+                result[_fail(row, registered.retries, error)] += 1
+        else:
+            Task.objects.filter(id__in=[row.id for row in queued]).delete()
+            result["done"] += len(queued)
+
+    return result
+
+
+def _fail(row: Task, retries: int, error: Exception) -> str:
+    row.attempts += 1
+    row.last_error = repr(error)
+    row.locked_until = None
+
+    if row.attempts > retries:
+        row.failed = True
+        outcome = "failed"
+    else:
+        row.run_after = timezone.now() + RETRY_DELAY * 2 ** (row.attempts - 1)
+        outcome = "retried"
+
+    row.save(update_fields=["attempts", "last_error", "locked_until", "failed", "run_after"])
+    return outcome
+
+
+# endregion
@@ -0,0 +1,63 @@
+from io import BytesIO
+
+import pytest
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from PIL import Image
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    The cache isn't rolled back with the database between tests.
+    """
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def sync_tasks(settings):
+    """
+    Run the background tasks in the request, the test transaction is never
+    committed for them to be queued.
+    """
+    settings.NETWORK_TASKS_MODE = "sync"
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    """
+    Store the files saved by the test in a temporary directory.
+    """
+    settings.MEDIA_ROOT = str(tmp_path)
+
+
+def png(size: int = 64, color: str | None = None) -> bytes:
+    """
+    A square PNG filled with ``color``, or with noise, which doesn't compress.
+    """
+    if color:
+        image = Image.new("RGB", (size, size), color)
+    else:
+        image = Image.effect_noise((size, size), 100)
+    data = BytesIO()
+    image.save(data, "PNG")
+    return data.getvalue()
+
+
+def update_profile(client, user, photo: bytes, name: str = "photo.png"):
+    """
+    Upload ``photo`` as the profile photo of ``user``, who must be logged in
+    with ``client``.
+    """
+    return client.post(
+        reverse("network:api:update_profile"),
+        {
+            "username": user.username,
+            "email": user.email,
+            "about": "",
+            "photo": SimpleUploadedFile(name, photo),
+        },
+    )
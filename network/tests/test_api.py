@@ -1,8 +1,20 @@
+from io import BytesIO, StringIO
+from tempfile import NamedTemporaryFile
+from time import time
+from unittest import mock
+
 import pytest
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
-from network.models import Comment, Post, User
+from network import serializers, timeline
+from network.models import Comment, Post, TimelineEntry, User
+from network.pagination import encode_cursor
+from network.schemas import PostOut
 
 
 def format_date(datetime: timezone.datetime):
@@ -90,6 +102,468 @@ class APITest(TestCase):
         self.assertEqual(json_resp["previousPage"], 1)
         self.assertEqual(len(json_resp["posts"]), 10)
 
+    def test_all_posts_cursor(self):
+        """
+        Test if following "nextCursor" walks through every post exactly once
+        """
+        new_posts = []
+        for i in range(20):
+            new_posts.append(Post(user=self.user1, text=f"post {2 + i}"))
+
+        Post.objects.bulk_create(new_posts)
+
+        url = reverse("network:api:all_posts_cursor")
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+
+        json_resp = response.json()
+
+        self.assertEqual(json_resp["numPages"], None)
+        self.assertIsNotNone(json_resp["nextCursor"])
+        self.assertEqual(len(json_resp["posts"]), 10)
+
+        seen = [post["id"] for post in json_resp["posts"]]
+        while json_resp["nextCursor"]:
+            response = self.client.get(url, {"cursor": json_resp["nextCursor"]})
+            self.assertEqual(response.status_code, 200)
+            json_resp = response.json()
+            seen += [post["id"] for post in json_resp["posts"]]
+
+        expected = list(
+            Post.objects.order_by("-publication_date", "-id").values_list("id", flat=True)
+        )
+        self.assertListEqual(seen, expected)
+
+        response = self.client.get(url, {"cursor": "not a cursor"})
+        self.assertEqual(response.status_code, 400)
+
+        # Well-formed cursors with values of the wrong type
+        for values in [
+            ("2020-01-01T00:00:00+00:00", "abc"),
+            ("2020-01-01T00:00:00+00:00", 2**63),
+            ("not a date", 1),
+            (None, 1),
+        ]:
+            response = self.client.get(url, {"cursor": encode_cursor(*values)})
+            self.assertEqual(response.status_code, 400)
+
+    def test_profile_cursor_route(self):
+        self.client.login(username="user1", password="password")
+
+        url = reverse("network:api:profile_cursor", args=["user1"])
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+
+        resp_json = response.json()
+
+        self.assertEqual(resp_json["username"], "user1")
+        self.assertEqual(len(resp_json["postsData"]["posts"]), 1)
+        self.assertEqual(resp_json["postsData"]["nextCursor"], None)
+
+    def test_profile_queries(self):
+        """
+        Test if the profile counts are right and the number of queries doesn't grow
+        with the posts of the profile user
+        """
+        self.client.login(username="user2", password="password")
+        self.client.post(reverse("network:api:follow", args=["user1"]))
+
+        url = reverse("network:api:profile", args=["user1", "1"])
+
+        with CaptureQueriesContext(connection) as few:
+            resp_json = self.client.get(url).json()
+
+        self.assertEqual(resp_json["followersCount"], 1)
+        self.assertEqual(resp_json["followingCount"], 0)
+        self.assertEqual(resp_json["isFollowing"], True)
+
+        Post.objects.bulk_create(
+            [Post(user=self.user1, text=f"post {i}") for i in range(30)]
+        )
+
+        # Posts created outside of the API don't invalidate the feed cache
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            resp_json = self.client.get(url).json()
+
+        self.assertEqual(len(resp_json["postsData"]["posts"]), 10)
+        self.assertEqual(len(many), len(few))
+
+    def test_followers_and_following(self):
+        """
+        Test if the follow lists walk through every edge, newest first, with the
+        viewer flags looked up once per page
+        """
+        followers = [
+            User.objects.create_user(username=f"follower{i}", password="password")
+            for i in range(15)
+        ]
+        for follower in followers:
+            User.objects.follow(follower, self.user1)
+        User.objects.follow(self.user2, followers[0])
+
+        self.client.login(username="user2", password="password")
+        url = reverse("network:api:followers", args=["user1"])
+
+        with CaptureQueriesContext(connection) as queries:
+            resp_json = self.client.get(url).json()
+
+        self.assertEqual(len(resp_json["users"]), 10)
+        self.assertIsNotNone(resp_json["nextCursor"])
+        # session, user, profile user, page, isFollowing flags
+        self.assertEqual(len(queries), 5)
+
+        seen = resp_json["users"]
+        resp_json = self.client.get(url, {"cursor": resp_json["nextCursor"]}).json()
+        self.assertIsNone(resp_json["nextCursor"])
+        seen += resp_json["users"]
+
+        self.assertListEqual(
+            [user["username"] for user in seen],
+            [follower.username for follower in reversed(followers)],
+        )
+        self.assertListEqual(
+            [user["username"] for user in seen if user["isFollowing"]], ["follower0"]
+        )
+
+        url = reverse("network:api:following", args=["user2"])
+        resp_json = self.client.get(url).json()
+        self.assertListEqual(
+            [user["username"] for user in resp_json["users"]], ["follower0"]
+        )
+
+    def test_fast_serializer(self):
+        """
+        Test if the fast serializer renders the same JSON as the schemas
+        """
+        parent = self.comment_child
+        for i in range(4):
+            parent = Comment.objects.create(
+                post=self.post1,
+                user=self.user2,
+                text=f"reply {i}",
+                parent_comment=parent,
+            )
+        Post.objects.add_like(self.post1.id, self.user2.id)
+        Post.objects.filter(id=self.post2.id).update(edited=True)
+        User.objects.follow(self.user1, self.user2)
+        timeline.rebuild([self.user1.id])
+        self.client.login(username="user1", password="password")
+
+        post_ids = [self.post1.id, self.post2.id]
+        self.assertDictEqual(
+            serializers.post_bodies(post_ids),
+            {
+                post.id: PostOut.from_orm(post).dict()
+                for post in Post.objects.fetch_bodies(post_ids)
+            },
+        )
+
+        urls = [
+            reverse("network:api:all_posts", args=[1]),
+            reverse("network:api:all_posts_cursor"),
+            reverse("network:api:following_posts", args=[1]),
+            reverse("network:api:following_posts_cursor"),
+        ]
+        for url in urls:
+            cache.clear()
+            expected = self.client.get(url).content
+
+            cache.clear()
+            with override_settings(NETWORK_FAST_SERIALIZER=True):
+                response = self.client.get(url)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, expected)
+
+    def test_conditional_requests(self):
+        """
+        Test if unchanged pages are answered with a 304, without querying the
+        posts, and changed ones with a new ETag
+        """
+        url = reverse("network:api:all_posts", args=[1])
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(len(queries), 0)
+
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+        self.client.login(username="user1", password="password")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        # Likes and follows of the viewer change their page
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse("network:api:like_post", args=[self.post2.id]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("network:api:follow", args=["user2"]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        url = reverse("network:api:profile", args=["user2", 1])
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # The profile fields are part of the ETag
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("network:api:follow", args=["user2"]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["followersCount"], 0)
+
+    def test_profile_last_modified(self):
+        """
+        Test if changing any field of a profile updates its Last-Modified
+        """
+        self.client.login(username="user1", password="password")
+        url = reverse("network:api:profile", args=["user1", 1])
+
+        changes = [
+            lambda: self.client.post(
+                reverse("network:api:update_profile"),
+                {"username": "user1", "email": "user1@email.com", "about": "New about"},
+            ),
+            lambda: self.client.post(reverse("network:api:follow", args=["user2"])),
+        ]
+        for later, change in enumerate(changes, start=1):
+            last_modified = self.client.get(url)["Last-Modified"]
+            self.assertEqual(
+                self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code,
+                304,
+            )
+
+            # A change one minute later
+            now = time() + 60 * later
+            with mock.patch("network.feed_cache.time", return_value=now):
+                with self.captureOnCommitCallbacks(execute=True):
+                    change()
+
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, 200)
+
+    def test_posts_since(self):
+        """
+        Test if polling returns only the new posts and the posts that changed
+        since the previous poll
+        """
+        url = reverse("network:api:all_posts_since")
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+        first = self.client.get(url, {"timestamp": self.post1.publication_date})
+        data = first.json()
+        self.assertListEqual([post["id"] for post in data["posts"]], [self.post2.id])
+        self.assertListEqual(data["updates"], [])
+
+        response = self.client.get(url, {"cursor": data["cursor"], "count": True})
+        self.assertEqual(response.json()["count"], 0)
+
+        Post.objects.bulk_create(
+            [Post(user=self.user1, text=f"post {3 + i}") for i in range(3)]
+        )
+        response = self.client.get(url, {"cursor": data["cursor"], "count": True})
+        self.assertEqual(response.json()["count"], 3)
+        self.assertFalse(response.json()["hasMore"])
+
+        # The activity cursor lags, start from the last poll of an idle client
+        activity = encode_cursor(timezone.now(), 0)
+        self.client.login(username="user1", password="password")
+        self.client.put(reverse("network:api:like_post", args=[self.post1.id]))
+
+        response = self.client.get(
+            url, {"cursor": data["cursor"], "activity": activity}
+        )
+        data = response.json()
+        self.assertListEqual(
+            [post["text"] for post in data["posts"]], ["post 5", "post 4", "post 3"]
+        )
+        self.assertListEqual(
+            [(update["id"], update["likes"]) for update in data["updates"]],
+            [(self.post1.id, 1)],
+        )
+
+        response = self.client.get(url, {"cursor": data["cursor"]})
+        self.assertListEqual(response.json()["posts"], [])
+
+        # The following feed only polls the followed users
+        url = reverse("network:api:following_posts_since")
+        response = self.client.get(url, {"timestamp": self.post1.publication_date})
+        self.assertListEqual(response.json()["posts"], [])
+
+        self.client.post(reverse("network:api:follow", args=["user2"]))
+        response = self.client.get(url, {"timestamp": self.post1.publication_date})
+        self.assertListEqual(
+            [post["id"] for post in response.json()["posts"]], [self.post2.id]
+        )
+
+    def test_all_posts_comment_tree_queries(self):
+        """
+        Test if the number of queries doesn't grow with the depth of the threads
+        """
+        url = reverse("network:api:all_posts", args=[1])
+
+        with CaptureQueriesContext(connection) as shallow:
+            self.client.get(url)
+
+        parent = self.comment_child
+        for i in range(5):
+            parent = Comment.objects.create(
+                post=self.post1,
+                user=self.user2,
+                text=f"reply {i}",
+                parent_comment=parent,
+            )
+
+        # Comments created outside of the API don't invalidate the feed cache
+        cache.clear()
+        with CaptureQueriesContext(connection) as deep:
+            response = self.client.get(url)
+
+        self.assertEqual(len(deep), len(shallow))
+
+        post1 = next(
+            post for post in response.json()["posts"] if post["id"] == self.post1.id
+        )
+        comment = next(c for c in post1["comments"] if c["id"] == self.comment1.id)
+        depth = 1
+        while comment["replies"]:
+            comment = comment["replies"][0]
+            depth += 1
+
+        # Only a preview of the thread is embedded
+        self.assertEqual(depth, 3)
+        self.assertEqual(comment["text"], "reply 0")
+        self.assertEqual(comment["replyCount"], 1)
+
+    @override_settings(NETWORK_COMMENTS_PREVIEW=2)
+    def test_comments_pagination(self):
+        """
+        Test if the feed embeds a bounded preview and the comments and replies
+        endpoints page through the rest
+        """
+        for i in range(12):
+            Comment.objects.create(
+                post=self.post1, user=self.user2, text=f"comment {3 + i}"
+            )
+
+        url = reverse("network:api:all_posts", args=[1])
+        post1 = next(
+            post
+            for post in self.client.get(url).json()["posts"]
+            if post["id"] == self.post1.id
+        )
+        self.assertEqual(len(post1["comments"]), 2)
+        self.assertEqual(post1["commentCount"], 15)
+
+        url = reverse("network:api:comments", args=[self.post1.id])
+        resp_json = self.client.get(url).json()
+        seen = [comment["id"] for comment in resp_json["comments"]]
+        self.assertEqual(len(seen), 10)
+
+        resp_json = self.client.get(url, {"cursor": resp_json["nextCursor"]}).json()
+        seen += [comment["id"] for comment in resp_json["comments"]]
+        self.assertIsNone(resp_json["nextCursor"])
+
+        top_level = Comment.objects.filter(post=self.post1, parent_comment=None)
+        self.assertCountEqual(seen, top_level.values_list("id", flat=True))
+
+        url = reverse("network:api:replies", args=[self.comment1.id])
+        resp_json = self.client.get(url).json()
+        self.assertListEqual(
+            [comment["id"] for comment in resp_json["comments"]],
+            [self.comment_child.id],
+        )
+
+        url = reverse("network:api:comments", args=[100])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_all_posts_cache(self):
+        """
+        Test if feed pages are served from the cache, overlaid with the flags of
+        the viewer, and invalidated by the views that change them
+        """
+        url = reverse("network:api:all_posts", args=[1])
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            resp_json = self.client.get(url).json()
+        self.assertEqual(resp_json["posts"][0]["isOwner"], False)
+
+        self.client.login(username="user1", password="password")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse("network:api:like_post", args=[self.post2.id]))
+
+        resp_json = self.client.get(url).json()
+        post2 = next(post for post in resp_json["posts"] if post["id"] == self.post2.id)
+        post1 = next(post for post in resp_json["posts"] if post["id"] == self.post1.id)
+        self.assertEqual(post2["likes"], 1)
+        self.assertEqual(post2["likedByUser"], True)
+        self.assertEqual(post2["isOwner"], False)
+        self.assertEqual(post1["isOwner"], True)
+
+        # Session, user and a single overlay query for the flags of the viewer
+        self.client.post(reverse("network:api:follow", args=["user2"]))
+        with self.assertNumQueries(3):
+            resp_json = self.client.get(url).json()
+        post2 = next(post for post in resp_json["posts"] if post["id"] == self.post2.id)
+        self.assertEqual(post2["isFollowing"], True)
+        self.assertEqual(post2["likedByUser"], True)
+
+        # Other viewers share the page, without the flags of user1
+        self.client.logout()
+        resp_json = self.client.get(url).json()
+        post2 = next(post for post in resp_json["posts"] if post["id"] == self.post2.id)
+        self.assertEqual(post2["likes"], 1)
+        self.assertEqual(post2["likedByUser"], False)
+
+        self.client.login(username="user1", password="password")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("network:api:new_post"),
+                {"text": "Hello World"},
+                content_type="application/json",
+            )
+
+        resp_json = self.client.get(url).json()
+        self.assertEqual(resp_json["posts"][0]["text"], "Hello World")
+        self.assertEqual(len(resp_json["posts"]), 3)
+
+    def test_renamed_commenter_cache(self):
+        """
+        Test if renaming a user updates the cached previews of the posts they
+        commented on
+        """
+        post = Post.objects.create(user=self.user1, text="post 3")
+        Comment.objects.create(post=post, user=self.user2, text="comment 3")
+        url = reverse("network:api:all_posts", args=[1])
+        self.client.get(url)
+
+        self.client.login(username="user2", password="password")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("network:api:update_profile"),
+                {"username": "renamed", "email": "user2@email.com", "about": ""},
+            )
+
+        resp_json = self.client.get(url).json()
+        post3 = next(row for row in resp_json["posts"] if row["id"] == post.id)
+        self.assertEqual(post3["comments"][0]["username"], "renamed")
+
     def test_profile_route(self):
         url = reverse("network:api:profile", args=["user1", "1"])
         self.client.login(username="user1", password="password")
@@ -122,6 +596,126 @@ class APITest(TestCase):
         self.assertEqual(self.post2.text, resp_json["posts"][0]["text"])
         self.assertEqual(True, resp_json["posts"][0]["isFollowing"])
 
+    def test_following_posts_timeline(self):
+        """
+        Test if new posts are fanned out to followers and evicted on unfollow
+        """
+        self.client.login(username="user1", password="password")
+        self.client.post(reverse("network:api:follow", args=["user2"]))
+
+        self.client.login(username="user2", password="password")
+        response = self.client.post(
+            reverse("network:api:new_post"),
+            {"text": "Hello followers"},
+            content_type="application/json",
+        )
+        post_id = response.json()["id"]
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user1, post_id=post_id).exists()
+        )
+
+        self.client.login(username="user1", password="password")
+        resp_json = self.client.get(
+            reverse("network:api:following_posts", args=["1"])
+        ).json()
+        self.assertListEqual(
+            [post["id"] for post in resp_json["posts"]], [post_id, self.post2.id]
+        )
+
+        # Unfollow
+        self.client.post(reverse("network:api:follow", args=["user2"]))
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user1).exists())
+
+        resp_json = self.client.get(
+            reverse("network:api:following_posts", args=["1"])
+        ).json()
+        self.assertListEqual(resp_json["posts"], [])
+
+    @override_settings(NETWORK_TIMELINE_LENGTH=2)
+    def test_timeline_trim(self):
+        self.client.login(username="user1", password="password")
+        self.client.post(reverse("network:api:follow", args=["user2"]))
+
+        for i in range(3):
+            Post.objects.create(user=self.user2, text=f"new post {i}")
+
+        self.client.post(reverse("network:api:follow", args=["user2"]))
+        self.client.post(reverse("network:api:follow", args=["user2"]))
+
+        self.assertEqual(TimelineEntry.objects.filter(user=self.user1).count(), 2)
+
+        timeline.rebuild([self.user1.id])
+        newest = Post.objects.filter(user=self.user2).order_by(
+            "-publication_date", "-id"
+        )
+        self.assertListEqual(
+            list(
+                TimelineEntry.objects.filter(user=self.user1)
+                .order_by("-publication_date", "-post_id")
+                .values_list("post_id", flat=True)
+            ),
+            list(newest.values_list("id", flat=True)[:2]),
+        )
+
+    @override_settings(NETWORK_FANOUT_LIMIT=0)
+    def test_following_posts_celebrity(self):
+        """
+        Test if posts from accounts above the fan-out limit are read on demand
+        """
+        self.client.login(username="user1", password="password")
+        self.client.post(reverse("network:api:follow", args=["user2"]))
+
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user1).exists())
+
+        resp_json = self.client.get(
+            reverse("network:api:following_posts", args=["1"])
+        ).json()
+        self.assertEqual(resp_json["posts"][0]["id"], self.post2.id)
+
+    @override_settings(NETWORK_FANOUT_LIMIT=1)
+    def test_following_feed_merge(self):
+        """
+        Test if the timeline and the posts of followed celebrities are merged
+        into the pages of the following feed, in both pagination modes
+        """
+        user3 = User.objects.create_user(  # type: ignore
+            username="user3", password="password", email="user3@email.com"
+        )
+        # user2 is a celebrity with 2 followers, user3 is fanned out
+        User.objects.follow(self.user1, self.user2)
+        User.objects.follow(user3, self.user2)
+        User.objects.follow(self.user1, user3)
+
+        Post.objects.bulk_create(
+            [Post(user=[self.user2, user3][i % 2], text=f"post {i}") for i in range(14)]
+        )
+        timeline.rebuild([self.user1.id])
+        self.assertEqual(TimelineEntry.objects.filter(user=self.user1).count(), 7)
+
+        expected = list(
+            Post.objects.filter(user__in=[self.user2, user3])
+            .order_by("-publication_date", "-id")
+            .values_list("id", flat=True)
+        )
+        self.client.login(username="user1", password="password")
+
+        url = reverse("network:api:following_posts_cursor")
+        resp_json = self.client.get(url).json()
+        seen = [post["id"] for post in resp_json["posts"]]
+        while resp_json["nextCursor"]:
+            resp_json = self.client.get(url, {"cursor": resp_json["nextCursor"]}).json()
+            seen += [post["id"] for post in resp_json["posts"]]
+        self.assertListEqual(seen, expected)
+
+        first = self.client.get(reverse("network:api:following_posts", args=[1])).json()
+        second = self.client.get(
+            reverse("network:api:following_posts", args=[2])
+        ).json()
+        self.assertEqual(first["numPages"], 2)
+        self.assertListEqual(
+            [post["id"] for post in first["posts"] + second["posts"]], expected
+        )
+
     def test_new_post(self):
         """
         Test if a new post was published
@@ -201,6 +795,115 @@ class APITest(TestCase):
         self.assertEqual(resp_json["likedByUser"], False)
         self.assertNotIn(self.user1, self.post1.liked_by.all())
 
+    def test_put_delete_likes(self):
+        """
+        Test if the PUT and DELETE like endpoints are idempotent
+        """
+        self.client.login(username="user1", password="password")
+
+        url = reverse("network:api:like_post", args=[self.post2.id])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.put(url)
+        # The author of the post is returned with the like count
+        self.assertFalse(
+            any(
+                query["sql"].startswith('SELECT "network_post"."user_id"')
+                for query in queries.captured_queries
+            )
+        )
+        self.client.delete(url)
+
+        for _ in range(2):
+            response = self.client.put(url)
+            self.assertEqual(response.status_code, 200)
+            resp_json = response.json()
+            self.assertEqual(resp_json["likes"], 1)
+            self.assertEqual(resp_json["likedByUser"], True)
+
+        self.post2.refresh_from_db()
+        self.assertEqual(self.post2.like_count, 1)
+        self.assertIn(self.user1, self.post2.liked_by.all())
+
+        for _ in range(2):
+            response = self.client.delete(url)
+            self.assertEqual(response.status_code, 200)
+            resp_json = response.json()
+            self.assertEqual(resp_json["likes"], 0)
+            self.assertEqual(resp_json["likedByUser"], False)
+
+        self.post2.refresh_from_db()
+        self.assertEqual(self.post2.like_count, 0)
+        self.assertNotIn(self.user1, self.post2.liked_by.all())
+
+        url = reverse("network:api:like_post", args=[100])
+        self.assertEqual(self.client.put(url).status_code, 404)
+        self.assertEqual(self.client.patch(url).status_code, 404)
+
+    def test_rebuild_like_counters(self):
+        """
+        Test if rebuild_counters detects and repairs drifted like counters
+        """
+        # Bypass PostManager.add_like so the counter drifts
+        self.post1.liked_by.add(self.user1, self.user2)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_counters", verify=True, stdout=StringIO())
+
+        call_command("rebuild_counters", batch_size=1, stdout=StringIO())
+        call_command("rebuild_counters", verify=True, stdout=StringIO())
+
+        self.post1.refresh_from_db()
+        self.post2.refresh_from_db()
+        self.assertEqual(self.post1.like_count, 2)
+        self.assertEqual(self.post2.like_count, 0)
+
+    def test_seed_network(self):
+        """
+        Test if seed_network is deterministic and loads consistent rows, from the
+        generator and from a JSONL dump
+        """
+        options = {"users": 30, "posts": 3, "seed": 7, "stdout": StringIO()}
+
+        dumps = []
+        for args in [[], [], ["--now=2030-06-01T12:00:00+00:00"]]:
+            with mock.patch("sys.stdout", mock.Mock(buffer=BytesIO())) as stdout:
+                call_command("seed_network", *args, dump="-", **options)
+            dumps.append(stdout.buffer.getvalue())
+        self.assertEqual(dumps[0], dumps[1])
+        self.assertNotEqual(dumps[0], dumps[2])
+        self.assertIn(b"2030-", dumps[2])
+
+        with NamedTemporaryFile(suffix=".jsonl") as dump:
+            call_command("seed_network", dump=dump.name, **options)
+            users = User.objects.count()
+            call_command("seed_network", load=dump.name, stdout=StringIO())
+
+        self.assertEqual(User.objects.count(), users + 30)
+        self.assertTrue(
+            User.objects.get(username=f"seed{users + 1}").check_password("password")
+        )
+        call_command("rebuild_counters", verify=True, stdout=StringIO())
+
+        call_command("seed_network", **options)
+        self.assertEqual(User.objects.count(), users + 60)
+        self.assertTrue(TimelineEntry.objects.exists())
+
+        with NamedTemporaryFile(suffix=".jsonl") as dump:
+            dump.write(b'{"model": "user", "id": 1000, "username": "loaded"}\n')
+            dump.write(b'{"model": "user", "username": "no id"}\n')
+            dump.flush()
+            with self.assertRaisesMessage(CommandError, "Line 2: user without id"):
+                call_command("seed_network", load=dump.name, stdout=StringIO())
+
+        # Dates set on creation default to the time of the load
+        with NamedTemporaryFile(suffix=".jsonl") as dump:
+            dump.write(b'{"model": "user", "id": 1000, "username": "loaded"}\n')
+            dump.write(b'{"model": "post", "id": 1000, "user_id": 1000, "text": "undated"}\n')
+            dump.flush()
+            call_command("seed_network", load=dump.name, stdout=StringIO())
+        self.assertIsNotNone(Post.objects.get(id=1000).publication_date)
+
     def test_new_comment(self):
         """
         Test if a new comment was published on the correct post
@@ -240,6 +943,21 @@ class APITest(TestCase):
         # )
         self.assertListEqual(resp_json["comments"][0]["replies"], [])
 
+    def test_follow_self(self):
+        self.client.login(username="user1", password="password")
+
+        url = reverse("network:api:follow", args=["user1"])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.user1.following.exists())
+        # Rejected before any write
+        self.assertFalse(
+            any(query["sql"].startswith("INSERT") for query in queries.captured_queries)
+        )
+
     def test_follow_user(self):
         self.client.login(username="user1", password="password")
 
@@ -259,12 +977,22 @@ class APITest(TestCase):
 
         self.assertNotIn(self.user2, self.user1.followers.all())
 
+        self.user1.refresh_from_db()
+        self.user2.refresh_from_db()
+        self.assertEqual(self.user1.following_count, 1)
+        self.assertEqual(self.user2.followers_count, 1)
+
         response = self.client.post(url)
         self.assertEqual(response.status_code, 200)
 
         self.assertNotIn(self.user2, self.user1.following.all())
         self.assertNotIn(self.user1, self.user2.followers.all())
 
+        self.user1.refresh_from_db()
+        self.user2.refresh_from_db()
+        self.assertEqual(self.user1.following_count, 0)
+        self.assertEqual(self.user2.followers_count, 0)
+
         resp_json = response.json()
         self.assertEqual(
             resp_json["message"], f"You are no longer following {self.user2.username}"
@@ -0,0 +1,110 @@
+from io import StringIO
+from tempfile import NamedTemporaryFile
+
+import orjson
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+from network import benchmark, timeline
+from network.models import Comment, Post, User
+
+
+@pytest.fixture(autouse=True)
+def whitenoise_autorefresh(settings):
+    settings.WHITENOISE_AUTOREFRESH = True
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user(  # type: ignore
+            username="viewer", password="password", email="viewer@email.com"
+        )
+        cls.author = User.objects.create_user(  # type: ignore
+            username="author", password="password", email="author@email.com"
+        )
+        User.objects.follow(cls.viewer, cls.author)
+
+        cls.post = Post.objects.create(user=cls.author, text="post 0")
+        Comment.objects.create(post=cls.post, user=cls.author, text="comment 0")
+        timeline.rebuild([cls.viewer.id])
+
+    def setUp(self):
+        self.client.force_login(self.viewer)
+
+    def query_counts(self) -> dict[str, int]:
+        """
+        Queries made by each benchmarked endpoint, each request rolled back so
+        they all start from the same state.
+        """
+        self.author.refresh_from_db()
+        counts = {}
+        for name, request in benchmark.scenarios(self.author, self.post).items():
+            cache.clear()
+            with transaction.atomic():
+                counts[name] = benchmark.measure(self.client, request)["queries"]
+                transaction.set_rollback(True)
+
+        return counts
+
+    def grow(self):
+        """
+        Fill every page and nest the comment threads deeper than the preview.
+        """
+        others = [
+            User.objects.create_user(username=f"user{i}", password="password") for i in range(5)
+        ]
+        Post.objects.bulk_create([Post(user=self.author, text=f"post {i + 1}") for i in range(30)])
+        for post in Post.objects.all():
+            post.liked_by.add(*others)
+            parent = None
+            for i in range(6):
+                parent = Comment.objects.create(
+                    post=post,
+                    user=others[i % len(others)],
+                    text=f"comment {i + 1}",
+                    parent_comment=parent,
+                )
+            Comment.objects.bulk_create(
+                [Comment(post=post, user=self.viewer, text=f"top {i}") for i in range(12)]
+            )
+        for user in others:
+            User.objects.follow(user, self.author)
+
+        call_command("rebuild_counters", stdout=StringIO())
+        timeline.rebuild([self.viewer.id])
+
+    def test_query_counts_are_bounded(self):
+        """
+        Test if no endpoint makes more queries with full pages, more followers,
+        likes and comments, or deeper threads
+        """
+        small = self.query_counts()
+        self.grow()
+        large = self.query_counts()
+
+        self.assertDictEqual(large, small)
+
+    def test_benchmark_api(self):
+        """
+        Test if benchmark_api writes the measures of every endpoint
+        """
+        with NamedTemporaryFile(suffix=".json") as output:
+            call_command(
+                "benchmark_api",
+                "all_posts",
+                "profile",
+                iterations=2,
+                warmup=0,
+                output=output.name,
+                stdout=StringIO(),
+            )
+            results = orjson.loads(output.read())
+
+        self.assertListEqual(list(results["endpoints"]), ["all_posts", "profile"])
+        for result in results["endpoints"].values():
+            self.assertEqual(result["statuses"], [200])
+            self.assertGreater(result["queries"], 0)
+            self.assertGreater(result["rows"], 0)
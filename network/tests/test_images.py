@@ -0,0 +1,103 @@
+from io import BytesIO
+from unittest import mock
+
+import pytest
+from django.core.files.storage import default_storage
+from django.test import TestCase
+from django.urls import reverse
+from network import images
+from network.models import User
+from network.tests.conftest import update_profile
+from PIL import Image, ImageOps
+
+
+@pytest.fixture(autouse=True)
+def whitenoise_autorefresh(settings):
+    settings.WHITENOISE_AUTOREFRESH = True
+
+
+def jpeg_with_exif(size: tuple[int, int] = (400, 300)) -> bytes:
+    image = Image.new("RGB", size, "red")
+    exif = Image.Exif()
+    # Camera model
+    exif[0x0110] = "Camera"
+    data = BytesIO()
+    image.save(data, "JPEG", exif=exif)
+    return data.getvalue()
+
+
+@pytest.mark.usefixtures("media_root")
+class PhotoVariantTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(  # type: ignore
+            username="user1", password="password", email="user1@email.com"
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def upload(self, photo: bytes = None) -> dict:
+        with self.captureOnCommitCallbacks(execute=True):
+            response = update_profile(
+                self.client, self.user, photo or jpeg_with_exif(), name="photo.jpg"
+            )
+        return response.json()
+
+    def test_photo_variants(self):
+        """
+        Test if an uploaded photo gets square variants without metadata,
+        exposed in the profile
+        """
+        self.assertDictEqual(self.upload()["photoVariants"], {})
+
+        response = self.client.get(reverse("network:api:profile", args=["user1", 1]))
+        variants = response.json()["photoVariants"]
+
+        self.assertListEqual(list(variants), ["48", "96", "256"])
+        for size, formats in variants.items():
+            self.assertListEqual(list(formats), ["webp", "jpeg"])
+            for url in formats.values():
+                self.assertTrue(url.startswith("/media/network/blobs/"))
+
+        self.user.refresh_from_db()
+        with default_storage.open(self.user.photo_variants["96"]["jpeg"]) as file:
+            variant = Image.open(file)
+            self.assertEqual(variant.size, (96, 96))
+            self.assertEqual(len(variant.getexif()), 0)
+
+        # Identical photos share their variants
+        previous = self.user.photo_variants
+        self.upload()
+        self.user.refresh_from_db()
+        self.assertDictEqual(self.user.photo_variants, previous)
+
+    def test_replaced_photo(self):
+        """
+        Test if the variants of a photo replaced while it was processed are
+        not saved
+        """
+        self.upload()
+        self.user.refresh_from_db()
+        User.objects.filter(id=self.user.id).update(photo_variants={})
+
+        images.process_photo(self.user.id, "network/user_1/previous.jpg")
+
+        self.user.refresh_from_db()
+        self.assertDictEqual(self.user.photo_variants, {})
+
+    def test_large_photo(self):
+        """
+        Test if photos past MAX_PHOTO_PIXELS are not decoded, and JPEG photos
+        are decoded at a reduced scale
+        """
+        with mock.patch.object(images, "MAX_PHOTO_PIXELS", 400 * 300 - 1):
+            self.upload()
+        self.user.refresh_from_db()
+        self.assertDictEqual(self.user.photo_variants, {})
+
+        with mock.patch.object(images.ImageOps, "fit", wraps=ImageOps.fit) as fit:
+            self.upload(jpeg_with_exif((2048, 1536)))
+        self.user.refresh_from_db()
+        self.assertListEqual(list(self.user.photo_variants), ["48", "96", "256"])
+        self.assertEqual(fit.call_args_list[0].args[0].size, (512, 384))
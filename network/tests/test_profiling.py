@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+import pytest
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from network import profiling
+from network.models import Comment, Post, User
+
+
+@pytest.fixture(autouse=True)
+def whitenoise_autorefresh(settings):
+    settings.WHITENOISE_AUTOREFRESH = True
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(  # type: ignore
+            username="user1", password="password", email="user1@email.com"
+        )
+        cls.admin = User.objects.create_user(  # type: ignore
+            username="admin",
+            password="password",
+            email="admin@email.com",
+            is_staff=True,
+        )
+        post = Post.objects.create(user=cls.user, text="post 1")
+        Comment.objects.create(post=post, user=cls.user, text="comment 1")
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse("network:api:all_posts", args=[1]))
+
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(NETWORK_API_PROFILING=True)
+    def test_server_timing_and_stats(self):
+        """
+        Test if profiled requests get a Server-Timing header and are aggregated
+        per endpoint
+        """
+        url = reverse("network:api:all_posts", args=[1])
+        for _ in range(2):
+            response = self.client.get(url)
+
+        timing = response["Server-Timing"]
+        for phase in (
+            "db;dur=",
+            "view;dur=",
+            "validation;dur=",
+            "render;dur=",
+            "total;",
+        ):
+            self.assertIn(phase, timing)
+        self.assertIn("queries", timing)
+
+        # Static pages are not profiled
+        response = self.client.get(reverse("network:login"))
+        self.assertNotIn("Server-Timing", response)
+
+        stats_url = reverse("network:api:profiling")
+        self.client.login(username="user1", password="password")
+        self.assertEqual(self.client.get(stats_url).status_code, 403)
+
+        self.client.login(username="admin", password="password")
+        stats = self.client.get(stats_url).json()["endpoints"]
+
+        self.assertEqual(stats["all_posts"]["requests"], 2)
+        self.assertGreater(stats["all_posts"]["avg_queries"], 0)
+
+        out = StringIO()
+        call_command("api_profile", reset=True, stdout=out)
+        self.assertIn("all_posts", out.getvalue())
+
+        out, err = StringIO(), StringIO()
+        call_command("api_profile", stdout=out, stderr=err)
+        self.assertIn("No requests profiled.", out.getvalue())
+        self.assertIn("Set CACHE_URL to a shared cache", err.getvalue())
+
+        shared = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache"}
+        with TemporaryDirectory() as location, override_settings(
+            CACHES={"default": {**shared, "LOCATION": location}}
+        ):
+            err = StringIO()
+            call_command("api_profile", stdout=StringIO(), stderr=err)
+            self.assertEqual(err.getvalue(), "")
+
+    def test_concurrent_records(self):
+        """
+        Test if requests recorded at the same time are all counted
+        """
+        profile = profiling.RequestProfile()
+        profile.queries.queries = 2
+        profile.total = 0.01
+
+        def record(i: int):
+            profiling.record(f"endpoint{i % 2}", profile)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(record, range(200)))
+
+        stats = profiling.stats()
+        self.assertEqual(stats["endpoint0"]["requests"], 100)
+        self.assertEqual(stats["endpoint1"]["avg_queries"], 2)
+        self.assertEqual(stats["endpoint1"]["max_ms"], 10)
+
+        profiling.reset()
+        self.assertDictEqual(profiling.stats(), {})
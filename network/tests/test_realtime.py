@@ -0,0 +1,154 @@
+import asyncio
+
+import orjson
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import Client, TestCase
+from django.urls import reverse
+from network import realtime
+from network.models import Post, User
+
+
+@pytest.fixture(autouse=True)
+def whitenoise_autorefresh(settings):
+    settings.WHITENOISE_AUTOREFRESH = True
+
+
+class StreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = User.objects.create_user(  # type: ignore
+            username="user1", password="password", email="user1@email.com"
+        )
+        cls.user2 = User.objects.create_user(  # type: ignore
+            username="user2", password="password", email="user2@email.com"
+        )
+        User.objects.follow(cls.user1, cls.user2)
+
+        cls.post1 = Post.objects.create(user=cls.user1, text="post 1")
+        cls.post2 = Post.objects.create(user=cls.user2, text="post 2")
+
+    def stream(self, query: str, action=None, cookie: str = "") -> tuple[int, list]:
+        """
+        Open a stream, run ``action`` once it's subscribed, then disconnect.
+        Returns the status and the (event, data) received.
+        """
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": realtime.STREAM_PATH,
+            "query_string": query.encode(),
+            "headers": [(b"cookie", cookie.encode())],
+        }
+
+        async def run():
+            sent = []
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                sent.append(message)
+
+            task = asyncio.ensure_future(realtime.stream(scope, receive, send))
+            while len(sent) < 2:
+                await asyncio.sleep(0.01)
+
+            if action is not None:
+                await sync_to_async(action)()
+            await asyncio.sleep(0.05)
+            disconnect.set()
+            await task
+
+            return sent
+
+        sent = async_to_sync(run)()
+        status = sent[0]["status"]
+        body = b"".join(message.get("body", b"") for message in sent[1:])
+
+        events = []
+        for frame in body.split(b"\n\n"):
+            lines = dict(line.split(b": ", 1) for line in frame.splitlines() if b": " in line)
+            if b"event" in lines:
+                events.append((lines[b"event"].decode(), orjson.loads(lines[b"data"])))
+
+        return status, events
+
+    def like(self, user: User, post: Post):
+        def action():
+            self.client.force_login(user)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.put(reverse("network:api:like_post", args=[post.id]))
+
+        return action
+
+    def test_global_stream(self):
+        """
+        Test if new posts, edits, likes and comments are pushed to the global scope
+        """
+
+        def action():
+            self.client.force_login(self.user1)
+            with self.captureOnCommitCallbacks(execute=True):
+                post = self.client.post(
+                    reverse("network:api:new_post"),
+                    {"text": "post 3"},
+                    content_type="application/json",
+                ).json()
+                self.client.post(
+                    reverse("network:api:edit_post"),
+                    {"postID": post["id"], "text": "post 3 edited"},
+                    content_type="application/json",
+                )
+                self.client.put(reverse("network:api:like_post", args=[self.post2.id]))
+                self.client.post(
+                    reverse("network:api:new_comment"),
+                    {"postID": self.post2.id, "text": "comment 1"},
+                    content_type="application/json",
+                )
+
+        status, events = self.stream("scope=global", action)
+
+        self.assertEqual(status, 200)
+        self.assertListEqual(
+            [event for event, _ in events],
+            ["new_post", "edit_post", "like", "new_comment"],
+        )
+        self.assertEqual(events[1][1]["text"], "post 3 edited")
+        self.assertDictEqual(events[2][1], {"id": self.post2.id, "likes": 1})
+        self.assertEqual(events[3][1]["commentCount"], 1)
+
+    def test_following_stream(self):
+        """
+        Test if the following scope only gets the posts of followed users
+        """
+        status, _ = self.stream("scope=following")
+        self.assertEqual(status, 401)
+
+        # The likes log self.client in as another user
+        client = Client()
+        client.force_login(self.user1)
+        cookie = f"sessionid={client.cookies['sessionid'].value}"
+
+        status, events = self.stream("scope=following", self.like(self.user2, self.post1), cookie)
+        self.assertEqual(status, 200)
+        self.assertListEqual(events, [])
+
+        status, events = self.stream("scope=following", self.like(self.user2, self.post2), cookie)
+        self.assertListEqual(events, [("like", {"id": self.post2.id, "likes": 1})])
+
+    def test_post_stream(self):
+        """
+        Test if the post scope only gets the events of that post
+        """
+        status, _ = self.stream("scope=post&post=0")
+        self.assertEqual(status, 404)
+
+        query = f"scope=post&post={self.post1.id}"
+        status, events = self.stream(query, self.like(self.user2, self.post2))
+        self.assertListEqual(events, [])
+
+        status, events = self.stream(query, self.like(self.user2, self.post1))
+        self.assertListEqual(events, [("like", {"id": self.post1.id, "likes": 1})])
@@ -0,0 +1,163 @@
+from base64 import urlsafe_b64encode
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from network import search
+from network.models import Post, User
+from network.pagination import encode_cursor
+
+
+@pytest.fixture(autouse=True)
+def whitenoise_autorefresh(settings):
+    settings.WHITENOISE_AUTOREFRESH = True
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = User.objects.create_user(  # type: ignore
+            username="user1", password="password", email="user1@email.com"
+        )
+        cls.user2 = User.objects.create_user(  # type: ignore
+            username="gardener", password="password", email="user2@email.com"
+        )
+
+    def new_post(self, text: str) -> int:
+        self.client.force_login(self.user1)
+        response = self.client.post(
+            reverse("network:api:new_post"),
+            {"text": text},
+            content_type="application/json",
+        )
+        return response.json()["id"]
+
+    def search(self, kind: str, q: str, cursor: str = None) -> dict:
+        params = {"q": q}
+        if cursor:
+            params["cursor"] = cursor
+        return self.client.get(reverse(f"network:api:search_{kind}"), params).json()
+
+    def test_search_posts(self):
+        """
+        Test if new and edited posts are indexed, ranked and paginated
+        """
+        tomatoes = self.new_post("Planting tomatoes in the garden")
+        garden = self.new_post("Garden party, garden games and garden food")
+        self.new_post("Nothing to see here")
+        Post.objects.create(user=self.user1, text="garden post that skipped the views")
+
+        data = self.search("posts", "GARDEN")
+        self.assertListEqual([post["id"] for post in data["posts"]], [garden, tomatoes])
+        self.assertIsNone(data["nextCursor"])
+        self.assertTrue(data["posts"][0]["likedByUser"])
+
+        # Stemming, prefix of the last word and all the words must match
+        self.assertEqual(len(self.search("posts", "planted tomat")["posts"]), 1)
+        self.assertListEqual(self.search("posts", "garden nothing")["posts"], [])
+        self.assertListEqual(self.search("posts", '"* OR :')["posts"], [])
+
+        self.client.post(
+            reverse("network:api:edit_post"),
+            {"postID": tomatoes, "text": "Picking peppers"},
+            content_type="application/json",
+        )
+        self.assertEqual(len(self.search("posts", "garden")["posts"]), 1)
+        self.assertEqual(self.search("posts", "peppers")["posts"][0]["id"], tomatoes)
+
+    def test_search_pagination(self):
+        """
+        Test if pages don't overlap and every result is sent once
+        """
+        post_ids = {self.new_post(f"walking the dog {i}") for i in range(12)}
+
+        first = self.search("posts", "dog")
+        second = self.search("posts", "dog", first["nextCursor"])
+
+        self.assertEqual(len(first["posts"]), 10)
+        self.assertIsNone(second["nextCursor"])
+        found = [post["id"] for post in first["posts"] + second["posts"]]
+        self.assertSetEqual(set(found), post_ids)
+        self.assertEqual(len(found), len(post_ids))
+
+        for cursor in [
+            "bad",
+            encode_cursor(1.5, 2**63),
+            encode_cursor(1.5, True),
+            encode_cursor(True, 1),
+            encode_cursor("1.5", 1),
+        ]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    reverse("network:api:search_posts"), {"q": "dog", "cursor": cursor}
+                )
+                self.assertEqual(response.status_code, 400)
+
+        # Larger than any integer orjson decodes
+        cursor = urlsafe_b64encode(b"[1.5, 18446744073709551615]").decode()
+        response = self.client.get(
+            reverse("network:api:search_posts"), {"q": "dog", "cursor": cursor}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_deleted(self):
+        """
+        Test if deleted posts and users leave the index, so they don't take
+        the place of results in a page
+        """
+        post_ids = [self.new_post(f"walking the dog {i}") for i in range(11)]
+        Post.objects.filter(id=post_ids[0]).delete()
+
+        data = self.search("posts", "dog")
+        self.assertEqual(len(data["posts"]), 10)
+        self.assertIsNone(data["nextCursor"])
+
+        # Their posts are deleted with them
+        self.user1.delete()
+        self.assertListEqual(self.search("posts", "dog")["posts"], [])
+        self.client.force_login(self.user2)
+        self.assertListEqual(self.search("users", "user1")["users"], [])
+
+    def test_search_users(self):
+        """
+        Test if users are found by username or about text, usernames first
+        """
+        self.client.force_login(self.user1)
+        self.client.post(
+            reverse("network:api:update_profile"),
+            {
+                "username": "user1",
+                "email": "user1@email.com",
+                "about": "I love gardens",
+            },
+        )
+        User.objects.follow(self.user1, self.user2)
+        search.index_user(self.user2)
+
+        data = self.search("users", "garden")
+        self.assertListEqual([user["username"] for user in data["users"]], ["gardener", "user1"])
+        self.assertTrue(data["users"][0]["isFollowing"])
+
+    def test_search_is_indexed(self):
+        """
+        Test if a search doesn't scan the posts table
+        """
+        self.new_post("indexed post")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.search("posts", "indexed")
+
+        self.assertFalse(
+            any(" LIKE " in query["sql"].upper() for query in queries.captured_queries)
+        )
+
+    def test_rebuild_search(self):
+        Post.objects.create(user=self.user1, text="imported post")
+        self.assertListEqual(self.search("posts", "imported")["posts"], [])
+
+        call_command("rebuild_search", stdout=StringIO())
+        self.assertEqual(len(self.search("posts", "imported")["posts"]), 1)
@@ -0,0 +1,111 @@
+import os
+from io import StringIO
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase
+from network.models import MediaBlob, User
+from network.tests.conftest import png, update_profile
+
+
+@pytest.fixture(autouse=True)
+def whitenoise_autorefresh(settings):
+    settings.WHITENOISE_AUTOREFRESH = True
+
+
+@pytest.mark.usefixtures("media_root")
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = User.objects.create_user(  # type: ignore
+            username="user1", password="password", email="user1@email.com"
+        )
+        cls.user2 = User.objects.create_user(  # type: ignore
+            username="user2", password="password", email="user2@email.com"
+        )
+
+    def upload(self, user: User, photo: bytes) -> str:
+        self.client.force_login(user)
+        update_profile(self.client, user, photo)
+        user.refresh_from_db()
+        return user.photo.name
+
+    def gc(self, *args) -> str:
+        out = StringIO()
+        call_command("gc_media", "--grace=0", *args, stdout=out)
+        return out.getvalue()
+
+    def test_identical_uploads_are_stored_once(self):
+        """
+        Test if identical files share their name and blob, and are counted
+        once per reference
+        """
+        name = self.upload(self.user1, png(color="red"))
+        self.assertEqual(self.upload(self.user2, png(color="red")), name)
+
+        blob = MediaBlob.objects.get(name=name)
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(blob.size, len(png(color="red")))
+
+        self.assertEqual(default_storage.save("other.png", ContentFile(png(color="red"))), name)
+
+    def test_save_missing_file(self):
+        """
+        Test if a blob whose file was deleted is written again when the same
+        content is saved
+        """
+        name = default_storage.save("photo.png", ContentFile(png(color="red")))
+        os.remove(default_storage.path(name))
+
+        self.assertEqual(default_storage.save("photo.png", ContentFile(png(color="red"))), name)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(MediaBlob.objects.filter(name=name).count(), 1)
+
+    def test_gc_media(self):
+        """
+        Test if replaced photos are only deleted by gc_media, once nothing
+        references them
+        """
+        red = self.upload(self.user1, png(color="red"))
+        self.upload(self.user2, png(color="red"))
+        blue = self.upload(self.user1, png(color="blue"))
+
+        self.gc()
+        self.assertTrue(default_storage.exists(red))
+
+        self.upload(self.user2, png(color="green"))
+        self.assertEqual(MediaBlob.objects.get(name=red).ref_count, 0)
+        self.assertTrue(default_storage.exists(red))
+
+        # The photo and its 6 variants
+        self.assertIn("Would delete 7 unreferenced blobs", self.gc("--dry-run"))
+        self.assertTrue(default_storage.exists(red))
+
+        self.assertIn("Deleted 7 unreferenced blobs", self.gc())
+        self.assertFalse(default_storage.exists(red))
+        self.assertFalse(MediaBlob.objects.filter(name=red).exists())
+        self.assertTrue(default_storage.exists(blue))
+
+    def test_gc_media_recount_and_scan(self):
+        """
+        Test if drifted counts are fixed and untracked files are only deleted
+        when nothing references them
+        """
+        blue = self.upload(self.user1, png(color="blue"))
+        MediaBlob.objects.filter(name=blue).update(ref_count=0)
+
+        # Photos stored before the content-addressed storage
+        legacy = "network/user_2/legacy.png"
+        default_storage._write(legacy, ContentFile(png(color="green")))
+        User.objects.filter(id=self.user2.id).update(photo=legacy)
+        orphan = "network/user_2/orphan.png"
+        default_storage._write(orphan, ContentFile(png(color="red")))
+
+        self.assertIn("1 reference counts drifted", self.gc("--recount", "--scan"))
+
+        self.assertTrue(default_storage.exists(blue))
+        self.assertEqual(MediaBlob.objects.get(name=blue).ref_count, 1)
+        self.assertTrue(default_storage.exists(legacy))
+        self.assertFalse(default_storage.exists(orphan))
@@ -0,0 +1,126 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from network import tasks, timeline
+from network.models import Post, Task, TimelineEntry, User
+
+
+@pytest.fixture(autouse=True)
+def database_tasks(settings):
+    settings.WHITENOISE_AUTOREFRESH = True
+    settings.NETWORK_TASKS_MODE = "database"
+
+
+class TaskQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = User.objects.create_user(  # type: ignore
+            username="user1", password="password", email="user1@email.com"
+        )
+        cls.user2 = User.objects.create_user(  # type: ignore
+            username="user2", password="password", email="user2@email.com"
+        )
+        cls.post = Post.objects.create(user=cls.user2, text="post 1")
+
+    def new_post(self) -> int:
+        self.client.force_login(self.user2)
+        response = self.client.post(
+            reverse("network:api:new_post"),
+            {"text": "Hello followers"},
+            content_type="application/json",
+        )
+        return response.json()["id"]
+
+    def test_run_tasks(self):
+        """
+        Test if the side effects are queued with the write and run by the worker
+        """
+        User.objects.follow(self.user1, self.user2)
+        post_id = self.new_post()
+
+        self.assertEqual(Task.objects.get().name, "network.timeline.fan_out_post")
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        out = StringIO()
+        call_command("run_tasks", once=True, stdout=out)
+
+        self.assertIn("1 tasks done, 0 retried, 0 failed", out.getvalue())
+        self.assertTrue(TimelineEntry.objects.filter(user=self.user1, post_id=post_id).exists())
+        self.assertFalse(Task.objects.exists())
+
+    def test_identical_tasks_run_once(self):
+        """
+        Test if the identical tasks of a batch are coalesced, and follow
+        toggles end in the state of the follow graph
+        """
+        self.client.force_login(self.user1)
+        url = reverse("network:api:follow", args=["user2"])
+        for _ in range(3):
+            self.client.post(url)
+
+        self.assertEqual(Task.objects.count(), 3)
+        with mock.patch.object(timeline, "backfill", wraps=timeline.backfill) as backfill:
+            result = tasks.run_batch()
+
+        self.assertDictEqual(result, {"done": 3, "retried": 0, "failed": 0})
+        self.assertEqual(backfill.call_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.user1, post=self.post).exists())
+
+    def test_retries(self):
+        """
+        Test if failing tasks are retried with a backoff, then kept as failed
+        """
+        User.objects.follow(self.user1, self.user2)
+        self.new_post()
+
+        with mock.patch("network.timeline.fan_out", side_effect=RuntimeError("down")):
+            self.assertEqual(tasks.run_batch()["retried"], 1)
+
+            task = Task.objects.get()
+            self.assertEqual(task.attempts, 1)
+            self.assertIn("down", task.last_error)
+            self.assertGreater(task.run_after, timezone.now())
+
+            # Not due yet
+            self.assertDictEqual(tasks.run_batch(), {"done": 0, "retried": 0, "failed": 0})
+
+            for _ in range(3):
+                Task.objects.update(run_after=timezone.now())
+                tasks.run_batch()
+
+        task = Task.objects.get()
+        self.assertTrue(task.failed)
+        self.assertEqual(task.attempts, 4)
+
+        call_command("run_tasks", once=True, retry_failed=True, stdout=StringIO())
+        self.assertFalse(Task.objects.exists())
+        self.assertTrue(TimelineEntry.objects.filter(user=self.user1).exists())
+
+    @mock.patch.object(tasks, "RETRY_DELAY", timedelta(milliseconds=50))
+    def test_thread_retries(self):
+        """
+        Test if a failing task in a thread is submitted again after the delay,
+        instead of holding a worker while it waits
+        """
+        done = threading.Event()
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("down")
+            done.set()
+
+        with mock.patch.object(tasks, "Timer", wraps=tasks.Timer) as timer:
+            tasks.executor().submit(tasks.RegisteredTask(flaky, retries=1)._run_in_thread, {})
+            self.assertTrue(done.wait(5))
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(timer.call_args.args[0], 0.05)
@@ -0,0 +1,77 @@
+from io import BytesIO
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from network.models import User
+from network.tests.conftest import png, update_profile
+from network.utility import FileValidator
+
+
+@pytest.fixture(autouse=True)
+def whitenoise_autorefresh(settings):
+    settings.WHITENOISE_AUTOREFRESH = True
+
+
+class ReadCounter(BytesIO):
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read = getattr(self, "bytes_read", 0) + len(data)
+        return data
+
+
+@pytest.mark.usefixtures("media_root")
+class UploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(  # type: ignore
+            username="user1", password="password", email="user1@email.com"
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def update_profile(self, photo: bytes) -> dict:
+        return update_profile(self.client, self.user, photo).json()
+
+    def test_validator_reads_the_header(self):
+        """
+        Test if the type of a file is sniffed from its first bytes only
+        """
+        file = ReadCounter(png(512))
+        validator = FileValidator(content_types=("image/png",), header_size=1024)
+
+        validator(file)
+
+        self.assertEqual(file.bytes_read, 1024)
+        self.assertEqual(file.tell(), 0)
+
+    def test_photo_upload(self):
+        """
+        Test if a valid photo is saved and other files are rejected by type
+        """
+        data = self.update_profile(png())
+        self.assertNotIn("errors", data)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.photo.name.endswith(".png"))
+
+        data = self.update_profile(b"not an image " * 100)
+        self.assertIn("photo", data["errors"])
+
+    @override_settings(NETWORK_UPLOAD_MAX_SIZE=4096)
+    def test_oversize_upload(self):
+        """
+        Test if uploads past the maximum size are dropped while streaming
+        """
+        photo = png(256)
+        self.assertGreater(len(photo), 4096)
+
+        data = self.update_profile(photo)
+
+        self.assertEqual(data["errors"]["photo"], "File size must not be greater than 4.0 KB.")
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.photo)
+
+        with self.assertRaises(ValidationError):
+            FileValidator(max_size=4096 / 1024 / 1024)(SimpleUploadedFile("photo.png", photo))
@@ -1,7 +1,10 @@
 import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 from django.utils import timezone
-from network.models import User
+from network import relationships
+from network.models import Post, User
 
 
 def format_date(datetime: timezone.datetime):
@@ -37,8 +40,10 @@ class UserProfileTests(TestCase):
         )
 
     def test_user_cant_follow_himself(self):
-        self.user1.following.add(self.user1)
-        self.user1.followers.add(self.user1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.user1.following.add(self.user1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.user1.followers.add(self.user1)
 
         self.assertNotIn(self.user1, self.user1.following.all())
         self.assertNotIn(self.user1, self.user1.followers.all())
@@ -61,3 +66,34 @@ class UserProfileTests(TestCase):
         self.assertNotIn(self.user1, self.user2.followers.all())
         self.assertIn(self.user1, self.user3.following.all())
         self.assertNotIn(self.user1, self.user3.followers.all())
+
+    def test_relationship_lookups(self):
+        """
+        Test if relationships are answered without loading the related sets
+        """
+        self.user1.following.add(self.user2)
+        post = Post.objects.create(user=self.user2, text="post 1")
+        post.liked_by.add(self.user1)
+
+        with self.assertNumQueries(1):
+            followed = relationships.followed_ids(self.user1, [self.user2.id, self.user3.id])
+        self.assertSetEqual(followed, {self.user2.id})
+
+        with self.assertNumQueries(1):
+            liked, following = relationships.overlay(
+                self.user1, [post.id], [self.user2.id, self.user3.id]
+            )
+        self.assertSetEqual(liked, {post.id})
+        self.assertSetEqual(following, {self.user2.id})
+
+        with self.assertNumQueries(1):
+            liked, following = relationships.overlay(self.user2, [post.id], [self.user1.id])
+        self.assertSetEqual(liked, set())
+        self.assertSetEqual(following, set())
+
+        # Anonymous viewers follow and like nothing, without a query
+        with self.assertNumQueries(0):
+            self.assertSetEqual(relationships.followed_ids(AnonymousUser(), [self.user2.id]), set())
+            self.assertTupleEqual(
+                relationships.overlay(AnonymousUser(), [post.id], [self.user2.id]), (set(), set())
+            )
@@ -0,0 +1,270 @@
+"""
+Fan-out-on-write home timelines.
+
+Every post is copied into the TimelineEntry rows of its author's followers
+when it's published, so the following feed is a bounded index scan on the
+reader's own timeline instead of a filter over the whole Post table.
+
+Accounts with more than NETWORK_FANOUT_LIMIT followers are not fanned out,
+their posts are merged into the timeline when it's read (fan-out-on-read).
+
+The views run the fan-out and the follow backfills as background tasks
+(network/tasks.py), after their transaction commits.
+"""
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import Follow, Post, TimelineEntry, User
+from .pagination import PAGE_SIZE, encode_cursor, keyset_page
+from .tasks import task
+
+BATCH_SIZE = 500
+
+
+def timeline_length() -> int:
+    return getattr(settings, "NETWORK_TIMELINE_LENGTH", 800)
+
+
+def fanout_limit() -> int:
+    return getattr(settings, "NETWORK_FANOUT_LIMIT", 10_000)
+
+
+def is_celebrity(user: User) -> bool:
+    return user.followers_count > fanout_limit()
+
+
+def celebrities_followed_by(user: User):
+    return user.following.filter(followers_count__gt=fanout_limit()).values("id")
+
+
+def following_filter(user: User) -> Q:
+    """
+    Posts in the following feed of ``user``: the materialized timeline plus
+    the posts of followed accounts that are read on demand.
+
+    Only for the "since" polls, whose scan of the Post table is bounded by
+    their cursor. The pages of the feed are read by FollowingFeed.
+    """
+    timeline = TimelineEntry.objects.filter(user=user).values("post_id")
+    return Q(id__in=timeline) | Q(user__in=celebrities_followed_by(user))
+
+
+class FollowingFeed:
+    """
+    The rows of the following feed of ``user``, newest first, in the format
+    of PostManager.fetch_all_posts.
+
+    The materialized timeline is read through timeline_user_idx and the
+    posts of the followed celebrities through post_user_feed_idx, then both
+    are merged, so a page never scans or sorts the Post table. Countable and
+    sliceable like a queryset, for Paginator.
+    """
+
+    def __init__(self, user: User):
+        self.user = user
+        self.celebrity_ids = list(celebrities_followed_by(user).values_list("id", flat=True))
+
+    def entries(self):
+        entries = TimelineEntry.objects.filter(user=self.user)
+        if self.celebrity_ids:
+            # Posts fanned out before their author became a celebrity
+            entries = entries.exclude(author_id__in=self.celebrity_ids)
+        return entries.values("post_id", "author_id", "publication_date")
+
+    def celebrity_posts(self):
+        return Post.objects.fetch_all_posts().filter(user_id__in=self.celebrity_ids)
+
+    def count(self) -> int:
+        total = self.entries().count()
+        if self.celebrity_ids:
+            total += self.celebrity_posts().count()
+        return total
+
+    def __getitem__(self, index: slice) -> list[dict]:
+        # Both sources are sorted, the first ``stop`` rows of the feed are
+        # among the first ``stop`` rows of each
+        stop = index.stop
+        entries = self.entries().order_by("-publication_date", "-post_id")[:stop]
+        posts = list(self.celebrity_posts()[:stop]) if self.celebrity_ids else []
+
+        return self.merge(entries, posts)[index]
+
+    def keyset_page(self, cursor: str | None, size: int = PAGE_SIZE):
+        """
+        keyset_page over both sources. Timeline entries have the
+        (publication_date, id) of their post, so the cursors are the same as
+        the ones of the other feeds.
+        """
+        entries, more_entries = keyset_page(
+            self.entries(), cursor, fields=("publication_date", "post_id"), size=size
+        )
+        posts, more_posts = [], None
+        if self.celebrity_ids:
+            posts, more_posts = keyset_page(self.celebrity_posts(), cursor, size=size)
+
+        rows = self.merge(entries, posts)
+        next_cursor = None
+
+        if len(rows) > size or more_entries or more_posts:
+            rows = rows[:size]
+            next_cursor = encode_cursor(rows[-1]["publication_date"], rows[-1]["id"])
+
+        return rows, next_cursor
+
+    @staticmethod
+    def merge(entries, posts: list[dict]) -> list[dict]:
+        rows = posts + [
+            {
+                "id": entry["post_id"],
+                "user_id": entry["author_id"],
+                "publication_date": entry["publication_date"],
+            }
+            for entry in entries
+        ]
+        rows.sort(key=lambda row: (row["publication_date"], row["id"]), reverse=True)
+        return rows
+
+
+def fan_out(post: Post):
+    """
+    Push a new post to the timelines of its author's followers.
+    """
+    if is_celebrity(post.user):
+        return
+
+    follower_ids = list(
+        Follow.objects.filter(followed_id=post.user_id).values_list("follower_id", flat=True)
+    )
+
+    for start in range(0, len(follower_ids), BATCH_SIZE):
+        batch = follower_ids[start : start + BATCH_SIZE]
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=follower_id,
+                    post_id=post.id,
+                    author_id=post.user_id,
+                    publication_date=post.publication_date,
+                )
+                for follower_id in batch
+            ],
+            ignore_conflicts=True,
+        )
+        trim(batch)
+
+
+def backfill(follower: User, author: User):
+    """
+    Copy the latest posts of a newly followed author to the follower timeline.
+    """
+    if is_celebrity(author):
+        return
+
+    posts = Post.objects.filter(user=author).order_by("-publication_date", "-id")
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=follower.id,
+                post_id=post_id,
+                author_id=author.id,
+                publication_date=publication_date,
+            )
+            for post_id, publication_date in posts.values_list("id", "publication_date")[
+                : timeline_length()
+            ]
+        ],
+        ignore_conflicts=True,
+    )
+    trim([follower.id])
+
+
+def evict(follower: User, author: User):
+    """
+    Remove the posts of an unfollowed author from the follower timeline.
+    """
+    TimelineEntry.objects.filter(user=follower, author=author).delete()
+
+
+@task()
+def fan_out_post(post_id: int):
+    """
+    fan_out, run after the post is committed.
+    """
+    post = Post.objects.select_related("user").filter(id=post_id).first()
+    if post is not None:
+        fan_out(post)
+
+
+@task()
+def sync_follow(follower_id: int, followed_id: int):
+    """
+    Backfill or evict the posts of ``followed_id`` in the timeline of
+    ``follower_id``, whichever matches the follow graph when it runs, so
+    follow and unfollow tasks give the same result in any order.
+    """
+    follower = User.objects.get(id=follower_id)
+    followed = User.objects.get(id=followed_id)
+
+    if Follow.objects.filter(follower=follower, followed=followed).exists():
+        backfill(follower, followed)
+    else:
+        evict(follower, followed)
+
+
+def rebuild(user_ids: list[int]):
+    """
+    Recompute the timelines of ``user_ids`` from the follow graph, e.g. after
+    a bulk import that bypassed fan_out.
+    """
+    length = timeline_length()
+    TimelineEntry.objects.filter(user_id__in=user_ids).delete()
+
+    entries = []
+    for user_id in user_ids:
+        followed = Follow.objects.filter(
+            follower_id=user_id, followed__followers_count__lte=fanout_limit()
+        ).values("followed_id")
+        # Only the newest posts that fit in the timeline are read
+        posts = (
+            Post.objects.filter(user__in=followed)
+            .order_by("-publication_date", "-id")
+            .values_list("id", "user_id", "publication_date")[:length]
+        )
+        entries += [
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                publication_date=publication_date,
+            )
+            for post_id, author_id, publication_date in posts
+        ]
+
+        if len(entries) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+            entries = []
+
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+def trim(user_ids: list[int]):
+    """
+    Keep only the newest NETWORK_TIMELINE_LENGTH entries of each timeline.
+    """
+    length = timeline_length()
+    overflowing = (
+        TimelineEntry.objects.filter(user_id__in=user_ids)
+        .values("user_id")
+        .annotate(total=Count("id"))
+        .filter(total__gt=length)
+        .values_list("user_id", flat=True)
+    )
+
+    for user_id in overflowing:
+        stale = (
+            TimelineEntry.objects.filter(user_id=user_id)
+            .order_by("-publication_date", "-post_id")
+            .values_list("id", flat=True)[length:]
+        )
+        TimelineEntry.objects.filter(id__in=list(stale)).delete()
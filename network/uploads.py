@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+
+# Bytes kept from the start of each upload to sniff its type, libmagic
+# doesn't need more to identify the image formats
+HEADER_SIZE = 8192
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Stream the uploaded files to temporary files, like
+    TemporaryFileUploadHandler, so no upload is held in memory.
+
+    A file bigger than NETWORK_UPLOAD_MAX_SIZE is dropped as soon as the chunk
+    that crosses the limit is received, the rest of it is read and discarded.
+    Its field name is added to ``request.rejected_uploads``.
+
+    The first HEADER_SIZE bytes of each file are kept in its ``header``
+    attribute, for FileValidator to sniff the type without reading the file
+    again.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = settings.NETWORK_UPLOAD_MAX_SIZE
+        if request is not None and not hasattr(request, "rejected_uploads"):
+            request.rejected_uploads = {}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = b""
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            if self.request is not None:
+                self.request.rejected_uploads[self.field_name] = self.max_size
+            raise SkipFile
+
+        if len(self.header) < HEADER_SIZE:
+            self.header += raw_data[: HEADER_SIZE - len(self.header)]
+
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.header = self.header
+        return file
@@ -15,6 +15,9 @@ def upload_path(instance, filename):
     """
     file will be uploaded to MEDIA_ROOT/user_<id>/<random_filename>
 
+    ContentAddressedStorage, the default storage, only keeps the extension
+    of this name and stores the file under the hash of its content.
+
     :param instance: An instance of the model where the FileField
     is defined. More specifically, this is the particular instance
     where the current file is being attached. In most cases, this
@@ -42,16 +45,28 @@ class FileValidator:
         "max_size": _(
             "File size must not be greater than %(max_size)s. Your file size is %(size)s."
         ),
-        "min_size": _(
-            "File size must not be less than %(min_size)s. Your file size is %(size)s."
-        ),
+        "min_size": _("File size must not be less than %(min_size)s. Your file size is %(size)s."),
         "content_type": _("File of type %(content_type)s are not supported."),
+        "upload_max_size": _("File size must not be greater than %(max_size)s."),
     }
 
-    def __init__(self, max_size=None, min_size=None, content_types=None):
+    def __init__(self, max_size=None, min_size=None, content_types=None, header_size=8192):
         self.max_size = max_size * 1024 * 1024 if max_size is not None else None
         self.min_size = min_size * 1024 * 1024 if min_size is not None else None
         self.content_types = content_types
+        # libmagic only needs the start of a file to identify its type
+        self.header_size = header_size
+
+    def upload_error(self, max_size) -> ValidationError:
+        """
+        Error of an upload dropped by BoundedUploadHandler past ``max_size``
+        bytes, before its size was known.
+        """
+        return ValidationError(
+            message=self.error_messages["upload_max_size"],
+            code="max_size",
+            params={"max_size": filesizeformat(max_size)},
+        )
 
     def __call__(self, file):
         if self.max_size is not None and file.size > self.max_size:
@@ -75,8 +90,7 @@ class FileValidator:
             )
 
         if self.content_types is not None:
-            content_type = magic.from_buffer(file.read(), mime=True)
-            file.seek(0)
+            content_type = magic.from_buffer(self.header(file), mime=True)
 
             if content_type not in self.content_types:
                 params = {"content_type": content_type}
@@ -88,10 +102,26 @@ class FileValidator:
 
         return file
 
+    def header(self, file) -> bytes:
+        """
+        The first bytes of ``file``, kept by BoundedUploadHandler or read from
+        the file, which is never read whole.
+        """
+        # Model validators get a FieldFile wrapping the uploaded file
+        header = getattr(getattr(file, "file", file), "header", None)
+        if header is not None:
+            return header[: self.header_size]
+
+        file.seek(0)
+        header = file.read(self.header_size)
+        file.seek(0)
+        return header
+
     def __eq__(self, other):
         return (
             isinstance(other, FileValidator)
             and self.max_size == other.max_size
             and self.min_size == other.min_size
             and self.content_types == other.content_types
+            and self.header_size == other.header_size
         )
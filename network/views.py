@@ -1,8 +1,10 @@
 from django.contrib.auth import authenticate, login, logout
+from django.db import transaction
 from django.forms import ValidationError
 from django.http import HttpRequest
 from django.shortcuts import redirect, render
 from django.views.decorators.http import require_POST, require_GET, require_http_methods
+from . import search
 from .models import User
 
 
@@ -63,7 +65,9 @@ def register(request: HttpRequest):
         try:
             username = request.POST["username"]
             email = request.POST["email"]
-            user = User.objects.create_user(username=username, email=email, password=password)  # type: ignore
+            with transaction.atomic():
+                user = User.objects.create_user(username=username, email=email, password=password)  # type: ignore
+                search.index_user(user)
         except ValidationError as e:
             messages = " ".join(
                 [f"{key}: {', '.join(value)}" for key, value in e.message_dict.items()]
@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project4.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once the apps are loaded
+from network import realtime  # noqa: E402
+
+# Server-Sent Events of the feeds, see network/realtime.py
+application = realtime.mount(django_application)
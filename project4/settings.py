@@ -26,7 +26,7 @@ env.read_env(BASE_DIR / ".env")
 SECRET_KEY = "13kl@xtukpwe&xj2xoysxe9_6=tf@f8ewxer5n&ifnd46+6$%8"
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = env("DEBUG")
+DEBUG = env.bool("DEBUG")
 
 ALLOWED_HOSTS = ["localhost", "0.0.0.0", "127.0.0.1"]
 
@@ -56,6 +56,8 @@ if DEBUG:
     ]
 
 MIDDLEWARE = [
+    # Disabled unless NETWORK_API_PROFILING is set
+    "network.profiling.ApiProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -96,12 +98,9 @@ WSGI_APPLICATION = "project4.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
-}
+# The web and worker processes must share it, e.g.
+# DATABASE_URL=postgres://user:password@db:5432/network_db in docker-compose
+DATABASES = {"default": env.db("DATABASE_URL", default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}")}
 
 # DATABASES = {
 #     "default": {
@@ -116,6 +115,12 @@ DATABASES = {
 
 AUTH_USER_MODEL = "network.User"
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# The feed page cache (network/feed_cache.py) must be shared by every worker
+# in production, e.g. CACHE_URL=redis://localhost:6379/1
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -163,6 +168,22 @@ MEDIA_ROOT = BASE_DIR / "media"
 # http://localhost:8000/media/
 MEDIA_URL = "/media/"
 
+# Files are named after the hash of their content and deleted by
+# "manage.py gc_media" once unreferenced (network/storage.py)
+DEFAULT_FILE_STORAGE = "network.storage.ContentAddressedStorage"
+
+# Uploads are streamed to temporary files and dropped past the maximum size
+# (network/uploads.py), so they are never held in memory
+FILE_UPLOAD_HANDLERS = ["network.uploads.BoundedUploadHandler"]
+# Same limit as the FileValidator of User.photo, in bytes
+NETWORK_UPLOAD_MAX_SIZE = int(2.5 * 1024 * 1024)
+# Background tasks of the views (network/tasks.py): "thread" runs them in
+# NETWORK_TASKS_WORKERS threads of the web process, "database" queues them for
+# "manage.py run_tasks", "sync" runs them in the request. Tasks queued in
+# threads are lost on a restart, so production queues them in the database.
+NETWORK_TASKS_MODE = env("NETWORK_TASKS_MODE", default="thread" if DEBUG else "database")
+NETWORK_TASKS_WORKERS = env.int("NETWORK_TASKS_WORKERS", default=2)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -170,3 +191,30 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # https://docs.djangoproject.com/en/4.0/ref/settings/#csrf-cookie-samesite
 CSRF_COOKIE_SAMESITE = "Strict"
+
+# Home timelines (network/timeline.py)
+# Number of posts kept in each materialized following feed
+NETWORK_TIMELINE_LENGTH = 800
+# Accounts with more followers than this are merged into timelines on read
+NETWORK_FANOUT_LIMIT = 10_000
+
+# Comment threads embedded in feed payloads (CommentManager.preview)
+# Newest comments kept at each level of a thread
+NETWORK_COMMENTS_PREVIEW = 3
+# Number of thread levels kept, top level comments included
+NETWORK_COMMENTS_PREVIEW_DEPTH = 3
+
+# Server-Timing headers and per-endpoint stats of the API (network/profiling.py).
+# The stats are kept in the default cache, "manage.py api_profile" only sees
+# the ones of the server with a shared CACHE_URL
+NETWORK_API_PROFILING = env.bool("NETWORK_API_PROFILING", default=False)
+
+# Build the feed responses from .values() rows, without the response schemas
+# (network/serializers.py)
+NETWORK_FAST_SERIALIZER = env.bool("NETWORK_FAST_SERIALIZER", default=False)
+
+# Broker of the events streamed by the ASGI app (network/realtime.py).
+# InProcessBroker only reaches the clients of the same process, set
+# "network.realtime.RedisBroker" to share the events between workers.
+NETWORK_BROKER = env("NETWORK_BROKER", default="network.realtime.InProcessBroker")
+NETWORK_BROKER_URL = env("NETWORK_BROKER_URL", default="redis://localhost:6379/0")